@@ -10,6 +10,19 @@ import io
 import re
 import threading
 import time
+import queue
+import sys
+import json
+import hashlib
+import mmap
+import struct
+import itertools
+import bisect
+import argparse
+import unicodedata
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -25,6 +38,41 @@ THEME_SELECTION = "#3c3c3c"    # Color de selección tipo resaltado
 THEME_TAB = "#d9d9d9"          # Color para texto de pestañas
 THEME_WARNING = "#ff6666"      # Color para botones de advertencia
 
+# Búsqueda mientras se escribe
+SEARCH_DEBOUNCE_MS = 250       # Espera tras la última tecla antes de buscar
+SEARCH_POLL_MS = 30            # Frecuencia de consulta de resultados del hilo de búsqueda
+SEARCH_PAGE_SIZE = 200         # Filas por página en la lista de resultados
+
+# Listas de colección y deck
+TREE_CHUNK_BUDGET_MS = 15      # Tiempo máximo por bloque al rellenar un Treeview grande
+NUMERIC_SORT_COLUMNS = {"ID", "Quantity", "quantity"}
+COLLECTION_COUNTS_HEADER = "#wcm-collection-counts 1"  # Primera línea del formato compacto
+SAVE_DELAY_MS = 800            # Inactividad tras la última edición antes de guardar en segundo plano
+
+# Imágenes de cartas
+DETAIL_SIZE = (350, 490)       # Imagen grande de los paneles de detalle
+THUMBNAIL_SIZE = (150, 210)    # Miniaturas del spoiler
+IMAGE_CACHE_BUDGET_MB = 64     # Memoria máxima para imágenes ya decodificadas
+THUMB_CACHE_BUDGET_MB = 512    # Disco máximo para miniaturas redimensionadas
+# Calidad de redimensionado: (filtro, margen sobre el tamaño destino al decodificar el JPEG reducido)
+IMAGE_QUALITY = {
+    "fast": (Image.BOX, 1),    # Mientras se desplaza: decodificación reducida y filtro caja
+    "high": (Image.LANCZOS, 2),  # En reposo y para la caché en disco
+}
+THUMB_LOADER_WORKERS = 4       # Hilos que cargan miniaturas en paralelo
+THUMB_UPGRADE_PRIORITY = 1_000_000  # Las mejoras de calidad van detrás de cualquier carga visible
+ATLAS_BUILD_PRIORITY = 2 * THUMB_UPGRADE_PRIORITY  # Construir atlas solo con el pool ocioso
+PREFETCH_AHEAD = 4             # Imágenes de detalle que se adelantan en la dirección de avance
+PREFETCH_BEHIND = 1            # ... y en la dirección contraria
+IMAGE_DRAIN_MS = 16            # Frecuencia con la que el hilo principal recoge imágenes decodificadas
+IMAGE_FRAME_BUDGET_MS = 8      # Tiempo máximo por frame creando PhotoImage
+SCROLL_SETTLE_MS = 250         # Tras este tiempo sin desplazarse, las miniaturas se piden ya en calidad
+PREWARM_CHUNK_SIZE = 256       # Cartas por tarea en la pre-generación por lotes
+
+# Rutas
+SETS_BASE_PATH = 'User\\sets'
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
 
 # === Language Dictionary (i18n) ===
 LANG = {
@@ -49,6 +97,7 @@ LANG = {
     "button_clear": "Clear",
     "button_open_file": "Open File",
     "button_import_deck": "Import Deck",
+    "button_export_wagic": "Export to Wagic",
 
     "tree_columns": ["ID", "Name", "Set", "Quantity"],
 
@@ -101,6 +150,1695 @@ LANG = {
 }
 
 
+# === Sintaxis de búsqueda ===
+# Campos admitidos: t:creature s:M10 r:rare cmc<=3 c:g o:"flying" n:goblin
+SEARCH_FIELDS = {
+    "t": "tipo", "type": "tipo",
+    "o": "texto", "oracle": "texto", "text": "texto",
+    "n": "nombre", "name": "nombre",
+    "s": "set", "set": "set", "e": "set",
+    "r": "rarity", "rarity": "rarity",
+    "cmc": "cmc", "mv": "cmc",
+    "c": "color", "color": "color",
+}
+SEARCH_TOKEN = re.compile(r'(?:(\w+)(<=|>=|!=|:|=|<|>))?(?:"([^"]*)"|(\S+))')
+RARITY_NAMES = {"c": "common", "u": "uncommon", "r": "rare", "m": "mythic",
+                "s": "special", "l": "land", "t": "token"}
+COLOR_BITS = {"w": 1, "u": 2, "b": 4, "r": 8, "g": 16}
+MANA_SYMBOL = re.compile(r"\{([^}]*)\}")
+
+
+def mana_value(mana):
+    """Coste de maná convertido de un coste estilo Wagic ({2}{R}{R}, {W/U}, {X}...)"""
+    total = 0
+    for symbol in MANA_SYMBOL.findall(mana or ""):
+        parts = symbol.upper().split("/")
+        numbers = [int(p) for p in parts if p.isdigit()]
+        if numbers:
+            total += max(numbers)
+        elif parts[0] not in ("X", "Y", "Z"):
+            total += 1
+    return total
+
+
+def mana_colors(mana):
+    """Máscara de colores (W=1, U=2, B=4, R=8, G=16) de un coste de maná"""
+    mask = 0
+    for symbol in MANA_SYMBOL.findall(mana or ""):
+        for part in symbol.lower().split("/"):
+            mask |= COLOR_BITS.get(part, 0)
+    return mask
+
+
+def parse_search_query(text):
+    """Divide la búsqueda en términos (campo, operador, valor, entrecomillado).
+
+    El texto libre usa campo None; los prefijos desconocidos se tratan como texto.
+    """
+    terms = []
+    for match in SEARCH_TOKEN.finditer(text):
+        key, op, quoted, bare = match.groups()
+        value = quoted if quoted is not None else bare
+        field = SEARCH_FIELDS.get(key.lower()) if key else None
+        if key and not field:
+            terms.append((None, None, match.group(0).replace('"', ''), quoted is not None))
+        elif value:
+            terms.append((field, op, value, quoted is not None))
+    return terms
+
+
+def read_collection_file(path):
+    """Lee una colección como {id: copias}.
+
+    Acepta el formato compacto (cabecera y una línea "id copias" por carta) y
+    el de Wagic (el id repetido una vez por copia), que se cuenta de una vez.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    lines = text.splitlines()
+    if lines and lines[0].strip() == COLLECTION_COUNTS_HEADER:
+        counts = {}
+        for line in lines[1:]:
+            parts = line.split()
+            if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit() and int(parts[1]) > 0:
+                counts[parts[0]] = int(parts[1])
+        return counts
+    return dict(Counter(card_id for card_id in text.split() if card_id.isdigit()))
+
+
+def format_collection_counts(counts):
+    """Colección en formato compacto (una línea por carta distinta)"""
+    return "".join([f"{COLLECTION_COUNTS_HEADER}\n"] +
+                   [f"{card_id} {count}\n" for card_id, count in counts.items() if count > 0])
+
+
+def format_collection_expanded(counts):
+    """Colección en el formato que lee Wagic (el id una vez por copia)"""
+    return "".join(f"{card_id}\n" * count for card_id, count in counts.items() if count > 0)
+
+
+def format_deck_file(deck_name, cards):
+    """Deck en el formato de Wagic: cabecera con el nombre y el id una vez por copia"""
+    return "".join([f"#NAME:{deck_name}\n"] + [f"{card_id}\n" * count for card_id, count in cards])
+
+
+def atomic_write_text(path, text):
+    """Escribe un archivo sin dejarlo a medias: temporal, fsync y os.replace"""
+    # Temporal propio de cada proceso e hilo: dos escrituras nunca comparten archivo
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class CardSearchIndex:
+    """Índice FTS5 auxiliar sobre nombre/tipo/subtipo/texto de `cartas`.
+
+    El índice vive en una base de datos aparte (junto a cards.db) que se adjunta
+    a la conexión principal como `fts`. Se reconstruye en segundo plano cuando
+    cambia la fecha o el tamaño de cards.db; mientras no esté listo, las
+    búsquedas usan el LIKE de siempre.
+    """
+
+    COLUMNS = ("nombre", "tipo", "subtipo", "texto")
+    # Versión del esquema del índice: cambiarla fuerza una reconstrucción
+    VERSION = 2
+    # Columnas FTS por campo de la sintaxis de búsqueda
+    FIELD_COLUMNS = {"tipo": ("tipo", "subtipo"), "texto": ("texto",), "nombre": ("nombre",)}
+    COMPARISONS = {":": "=", "=": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+    # Pesos bm25 por columna: el nombre pesa más que el texto de reglas
+    WEIGHTS = (10.0, 4.0, 4.0, 1.0)
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.index_path = os.path.splitext(db_path)[0] + "_search.db"
+        self.available = True
+        self.ready = False
+        self._building = False
+        self._lock = threading.Lock()
+
+    def source_signature(self):
+        """Firma de cards.db (mtime y tamaño) para detectar cambios"""
+        try:
+            st = os.stat(self.db_path)
+            return f"v{self.VERSION}:{st.st_mtime_ns}:{st.st_size}"
+        except OSError:
+            return None
+
+    @staticmethod
+    def register_functions(conn):
+        """Funciones SQL para calcular coste y colores cuando no hay índice"""
+        conn.create_function("wagic_cmc", 1, mana_value, deterministic=True)
+        conn.create_function("wagic_colors", 1, mana_colors, deterministic=True)
+
+    def attach(self, conn):
+        """Adjunta la base del índice a una conexión y comprueba si está al día"""
+        self.register_functions(conn)
+        try:
+            conn.execute("ATTACH DATABASE ? AS fts", (self.index_path,))
+        except sqlite3.Error as e:
+            logging.warning(f"No se pudo adjuntar el índice de búsqueda: {e}")
+            self.available = False
+            return
+        self.ensure_fresh(conn)
+
+    def ensure_fresh(self, conn):
+        """Marca el índice como listo o lanza su reconstrucción si está desactualizado"""
+        if not self.available:
+            return False
+        signature = self.source_signature()
+        stored = None
+        try:
+            row = conn.execute("SELECT value FROM fts.index_meta WHERE key = 'signature'").fetchone()
+            stored = row[0] if row else None
+        except sqlite3.Error:
+            pass
+        self.ready = signature is not None and stored == signature
+        if not self.ready:
+            self.rebuild_async()
+        return self.ready
+
+    def rebuild_async(self):
+        with self._lock:
+            if self._building or not self.available:
+                return
+            self._building = True
+        threading.Thread(target=self._rebuild, daemon=True).start()
+
+    def _rebuild(self):
+        """Reconstruye el índice con una conexión propia (hilo en segundo plano)"""
+        signature = self.source_signature()
+        start = time.perf_counter()
+        try:
+            conn = sqlite3.connect(self.index_path, timeout=30)
+            self.register_functions(conn)
+            try:
+                conn.execute("ATTACH DATABASE ? AS src", (self.db_path,))
+                cols = ", ".join(self.COLUMNS)
+                with conn:
+                    conn.execute("DROP TABLE IF EXISTS main.cartas_fts")
+                    conn.execute(f"""
+                        CREATE VIRTUAL TABLE main.cartas_fts USING fts5(
+                            {cols},
+                            tokenize = 'unicode61 remove_diacritics 2',
+                            prefix = '2 3'
+                        )
+                    """)
+                    conn.execute(f"""
+                        INSERT INTO main.cartas_fts(rowid, {cols})
+                        SELECT rowid, {cols} FROM src.cartas
+                    """)
+                    conn.execute("INSERT INTO main.cartas_fts(cartas_fts) VALUES('optimize')")
+                    # Atributos normalizados e indexados para los filtros por campo
+                    conn.execute("DROP TABLE IF EXISTS main.cartas_attrs")
+                    conn.execute("""
+                        CREATE TABLE main.cartas_attrs (
+                            rowid INTEGER PRIMARY KEY,
+                            set_key TEXT,
+                            rarity_key TEXT,
+                            cmc INTEGER,
+                            colors INTEGER
+                        )
+                    """)
+                    conn.execute("""
+                        INSERT INTO main.cartas_attrs
+                        SELECT rowid, lower(set_nombre), lower(rarity), wagic_cmc(mana), wagic_colors(mana)
+                        FROM src.cartas
+                    """)
+                    for col in ("set_key", "rarity_key", "cmc", "colors"):
+                        conn.execute(f"CREATE INDEX main.idx_attrs_{col} ON cartas_attrs({col})")
+                    conn.execute("CREATE TABLE IF NOT EXISTS main.index_meta (key TEXT PRIMARY KEY, value TEXT)")
+                    conn.execute("INSERT OR REPLACE INTO main.index_meta VALUES ('signature', ?)", (signature,))
+            finally:
+                conn.close()
+            self.ready = signature == self.source_signature()
+            logging.info(f"Índice de búsqueda reconstruido en {time.perf_counter() - start:.2f}s")
+        except sqlite3.OperationalError as e:
+            # SQLite sin FTS5 o base bloqueada: seguimos con LIKE
+            logging.warning(f"Índice FTS5 no disponible, se usará LIKE: {e}")
+            self.available = False
+        except Exception as e:
+            logging.error(f"Error al reconstruir el índice de búsqueda: {e}")
+        finally:
+            with self._lock:
+                self._building = False
+
+    @staticmethod
+    def match_phrase(value, quoted):
+        """Frase MATCH: literal si venía entre comillas, por prefijos si no"""
+        tokens = re.findall(r"\w+", value, re.UNICODE)
+        if not tokens:
+            return ""
+        if quoted:
+            return '"' + " ".join(tokens) + '"'
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    def _attr_predicate(self, field, op, value, indexed):
+        """Condición SQL (y parámetros) para s:, r:, cmc y c:.
+
+        Un valor no válido (cmc<=x, c:xz) no debe ampliar la búsqueda a todas
+        las cartas: se convierte en una condición que no coincide con nada.
+        """
+        value = value.lower()
+        if field == "set":
+            column = "a.set_key" if indexed else "lower(c.set_nombre)"
+            return f"{column} = ?", [value]
+        if field == "rarity":
+            column = "a.rarity_key" if indexed else "lower(c.rarity)"
+            names = {value, RARITY_NAMES.get(value, value)}
+            names |= {k for k, v in RARITY_NAMES.items() if v == value}
+            return f"{column} IN ({','.join('?' for _ in names)})", sorted(names)
+        if field == "cmc":
+            if not value.isdigit():
+                logging.warning(f"Filtro de maná no válido: {value!r}")
+                return "0", []
+            column = "a.cmc" if indexed else "wagic_cmc(c.mana)"
+            return f"{column} {self.COMPARISONS[op]} ?", [int(value)]
+        if field == "color":
+            wanted = 0
+            for letter in value:
+                if letter not in COLOR_BITS and letter != "c":
+                    logging.warning(f"Filtro de color no válido: {value!r}")
+                    return "0", []
+                wanted |= COLOR_BITS.get(letter, 0)
+            # Máscaras que contienen todos los colores pedidos (c:c = incoloro)
+            masks = [m for m in range(32) if m & wanted == wanted] if wanted else [0]
+            column = "a.colors" if indexed else "wagic_colors(c.mana)"
+            return f"{column} IN ({','.join(str(m) for m in masks)})", []
+        return None, []
+
+    def _filter(self, conn, text):
+        """Devuelve (from_sql, where_sql, params, rank_sql) para el texto buscado"""
+        indexed = self.ensure_fresh(conn)
+        match_terms, where, params = [], [], []
+        for field, op, value, quoted in parse_search_query(text):
+            if field in (None, "tipo", "texto", "nombre"):
+                phrase = self.match_phrase(value, quoted) if indexed else ""
+                if phrase:
+                    if field:
+                        cols = " ".join(self.FIELD_COLUMNS[field])
+                        phrase = f"{{{cols}}} : ({phrase})"
+                    match_terms.append(phrase)
+                else:
+                    # Sin índice (o sin palabras): subcadena en las columnas del campo
+                    cols = self.FIELD_COLUMNS[field] if field else self.COLUMNS
+                    where.append("(" + " OR ".join(f"c.{col} LIKE ?" for col in cols) + ")")
+                    params += [f"%{value}%" for _ in cols]
+            else:
+                condition, values = self._attr_predicate(field, op, value, indexed)
+                if condition:
+                    where.append(condition)
+                    params += values
+        
+        from_sql, rank = "cartas c", ""
+        if match_terms:
+            weights = ", ".join(str(w) for w in self.WEIGHTS)
+            from_sql = "fts.cartas_fts JOIN cartas c ON c.rowid = cartas_fts.rowid"
+            where.insert(0, "cartas_fts MATCH ?")
+            params.insert(0, " AND ".join(match_terms))
+            rank = f"bm25(cartas_fts, {weights}), "
+        if indexed and any(cond.startswith("a.") for cond in where):
+            from_sql += " JOIN fts.cartas_attrs a ON a.rowid = c.rowid"
+        return from_sql, " AND ".join(where) or "1", params, rank
+
+    def build_query(self, conn, text, columns, limit=None, order="rank", after=None):
+        """Devuelve (sql, params) para buscar `text` devolviendo `columns` de cartas.
+
+        Con order="nombre" los resultados se ordenan por (nombre, rowid) y `after`
+        permite paginar por clave (keyset) a partir de la última fila recibida.
+        """
+        select = ", ".join(f"c.{col}" for col in columns)
+        from_sql, where, params, rank = self._filter(conn, text)
+        if order == "nombre":
+            if after is not None:
+                where += " AND (ifnull(c.nombre, ''), c.rowid) > (?, ?)"
+                params += list(after)
+            order_sql = "ifnull(c.nombre, ''), c.rowid"
+        else:
+            order_sql = f"{rank}c.nombre"
+        limit_sql = f" LIMIT {int(limit)}" if limit else ""
+        sql = f"""
+            SELECT {select}
+            FROM {from_sql}
+            WHERE {where}
+            ORDER BY {order_sql}{limit_sql}
+        """
+        return sql, tuple(params)
+
+    def count_query(self, conn, text):
+        """Devuelve (sql, params) para contar los resultados de `text`"""
+        from_sql, where, params, _ = self._filter(conn, text)
+        return f"SELECT COUNT(*) FROM {from_sql} WHERE {where}", tuple(params)
+
+
+class SearchWorker:
+    """Hilo de búsqueda con su propia conexión a SQLite.
+
+    Solo se ejecuta la consulta más reciente: al enviar una nueva, la que esté
+    en curso se aborta con `Connection.interrupt()`. Los resultados se piden por
+    páginas de `page_size` filas ordenadas por nombre (paginación por clave) y se
+    dejan en `self.results` como (generación, consulta, filas, total, after,
+    error) para que el hilo principal los recoja. `total` solo se calcula con la
+    primera página.
+    """
+
+    def __init__(self, db_path, search_index, columns, page_size):
+        self.db_path = db_path
+        self.search_index = search_index
+        self.columns = columns
+        self.page_size = page_size
+        self.results = queue.Queue()
+        self.generation = 0
+        self._pending = None
+        self._running = False
+        self._closed = False
+        self._conn = None
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, query, after=None):
+        """Encola una búsqueda, cancelando la anterior. Devuelve su generación.
+
+        Con `after` (clave de la última fila recibida) se pide la página
+        siguiente de la búsqueda actual sin cancelarla.
+        """
+        with self._cond:
+            if after is None:
+                self.generation += 1
+                if self._running and self._conn is not None:
+                    self._conn.interrupt()
+            self._pending = (self.generation, query, after)
+            self._cond.notify()
+            return self.generation
+
+    def cancel(self):
+        """Descarta la búsqueda pendiente y aborta la que esté en curso"""
+        with self._cond:
+            self.generation += 1
+            self._pending = None
+            if self._running and self._conn is not None:
+                self._conn.interrupt()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            if self._running and self._conn is not None:
+                self._conn.interrupt()
+            self._cond.notify()
+
+    def _run(self):
+        self._conn = sqlite3.connect(self.db_path)
+        self.search_index.attach(self._conn)
+        try:
+            while True:
+                with self._cond:
+                    while self._pending is None and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        return
+                    generation, query, after = self._pending
+                    self._pending = None
+                    self._running = True
+                rows, total, error = [], None, None
+                try:
+                    sql, params = self.search_index.build_query(
+                        self._conn, query, self.columns, self.page_size, order="nombre", after=after)
+                    rows = self._conn.execute(sql, params).fetchall()
+                    if after is None:
+                        sql, params = self.search_index.count_query(self._conn, query)
+                        total = self._conn.execute(sql, params).fetchone()[0]
+                except sqlite3.OperationalError as e:
+                    if generation != self.generation:
+                        continue  # Consulta interrumpida por otra más reciente
+                    error = e
+                except Exception as e:
+                    # Cualquier fallo se entrega como error de esta consulta; el hilo sigue vivo
+                    logging.exception(f"Error en la búsqueda: {query!r}")
+                    error = e
+                finally:
+                    with self._cond:
+                        self._running = False
+                if generation == self.generation:
+                    self.results.put((generation, query, rows, total, after, error))
+        finally:
+            self._conn.close()
+
+
+class CardRecord:
+    """Vista ligera de una carta del catálogo"""
+    __slots__ = ("id", "nombre", "mana", "set_nombre", "rarity", "tipo", "subtipo", "texto")
+
+    def __init__(self, *values):
+        for slot, value in zip(self.__slots__, values):
+            setattr(self, slot, value)
+
+
+class CardCatalog:
+    """Copia en memoria de `cartas` guardada por columnas.
+
+    Los ids se guardan como enteros en un `array`, las cadenas se internan
+    (sets, rarezas y tipos se repiten mucho) y cada consulta devuelve un
+    `CardRecord`. Se carga en segundo plano y se recarga sola si cards.db
+    cambia en disco; mientras no esté lista, `ready` es False.
+    """
+
+    COLUMNS = CardRecord.__slots__
+    CHECK_INTERVAL = 2.0  # Segundos entre comprobaciones de cambios en cards.db
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._data = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._loading = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        self._check_fresh()
+        return self._data is not None
+
+    def _current_signature(self):
+        try:
+            st = os.stat(self.db_path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _check_fresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        if self._current_signature() != self._signature:
+            self.load_async()
+
+    def load_async(self):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self._load, daemon=True).start()
+
+    def _load(self):
+        start = time.perf_counter()
+        signature = self._current_signature()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                rows = conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM cartas")
+                ids = array('q')
+                columns = [[] for _ in self.COLUMNS[1:]]
+                by_id, by_name = {}, {}
+                intern = sys.intern
+                for row in rows:
+                    try:
+                        card_id = int(row[0])
+                    except (TypeError, ValueError):
+                        continue
+                    index = len(ids)
+                    ids.append(card_id)
+                    for column, value in zip(columns, row[1:]):
+                        column.append(intern(value) if isinstance(value, str) else value)
+                    by_id.setdefault(card_id, index)
+                    by_name.setdefault(columns[0][index], []).append(index)
+            finally:
+                conn.close()
+            # Sustitución atómica: los lectores ven la versión anterior o la nueva
+            self._data = (ids, columns, by_id, by_name)
+            self._signature = signature
+            logging.info(f"Catálogo cargado: {len(ids)} cartas en {time.perf_counter() - start:.2f}s")
+        except sqlite3.Error as e:
+            logging.error(f"Error al cargar el catálogo de cartas: {e}")
+        finally:
+            with self._lock:
+                self._loading = False
+
+    @staticmethod
+    def _record(data, index):
+        ids, columns = data[0], data[1]
+        return CardRecord(str(ids[index]), *(column[index] for column in columns))
+
+    def get(self, card_id):
+        """Devuelve la carta con ese id (o None)"""
+        data = self._data
+        if data is None:
+            return None
+        try:
+            index = data[2].get(int(card_id))
+        except (TypeError, ValueError):
+            return None
+        return None if index is None else self._record(data, index)
+
+    def get_many(self, card_ids):
+        """Devuelve {id: CardRecord} para los ids que existan"""
+        data = self._data
+        found = {}
+        if data is None:
+            return found
+        by_id = data[2]
+        for card_id in card_ids:
+            try:
+                index = by_id.get(int(card_id))
+            except (TypeError, ValueError):
+                continue
+            if index is not None:
+                found[card_id] = self._record(data, index)
+        return found
+
+    def find_by_name(self, name, set_name=None):
+        """Primera carta con ese nombre exacto (y set, si se indica)"""
+        data = self._data
+        if data is None:
+            return None
+        sets = data[1][2]
+        for index in data[3].get(name, ()):
+            if set_name is None or sets[index] == set_name:
+                return self._record(data, index)
+        return None
+
+
+class CardNameMatcher:
+    """Índice de trigramas sobre los nombres de carta para corregir nombres a mano.
+
+    Normaliza acentos, mayúsculas y puntuación ("Fire/Ice" == "Fire // Ice"),
+    indexa también cada mitad de las cartas partidas y puntúa los candidatos
+    con el coeficiente de Dice sobre trigramas.
+    """
+
+    AUTO_SCORE = 0.75     # A partir de aquí se corrige sin preguntar
+    SUGGEST_SCORE = 0.45  # A partir de aquí solo se sugiere
+    COMMON_POSTING = 500  # Trigramas más frecuentes que esto no generan candidatos
+
+    def __init__(self, names):
+        self.names = []
+        self.keys = []
+        self.exact = {}
+        self.postings = {}
+        for name in names:
+            if not name:
+                continue
+            self._add(self.normalize(name), name)
+        # Las mitades de cartas partidas solo si no chocan con una carta real
+        for name in list(self.names):
+            if "//" in name:
+                for half in name.split("//"):
+                    key = self.normalize(half)
+                    if key and key not in self.exact:
+                        self._add(key, name)
+
+    def _add(self, key, name):
+        if key in self.exact:
+            return
+        index = len(self.names)
+        self.names.append(name)
+        self.keys.append(key)
+        self.exact[key] = index
+        for gram in self.grams(key):
+            self.postings.setdefault(gram, array('i')).append(index)
+
+    @staticmethod
+    def normalize(name):
+        """Minúsculas, sin acentos y con la puntuación convertida en espacios"""
+        text = unicodedata.normalize("NFKD", name.replace("Æ", "Ae").replace("æ", "ae"))
+        text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+        text = re.sub(r"[^\w]+|_", " ", text)
+        return " ".join(text.split())
+
+    @staticmethod
+    def grams(key):
+        padded = f"  {key} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def match(self, name):
+        """Devuelve (nombre_canónico, puntuación) del mejor candidato, o (None, 0.0)"""
+        key = self.normalize(name)
+        if not key:
+            return None, 0.0
+        index = self.exact.get(key)
+        if index is not None:
+            return self.names[index], 1.0
+        grams = self.grams(key)
+        # Generar candidatos con los trigramas poco frecuentes (los tres más raros como mínimo)
+        postings = sorted((self.postings[g] for g in grams if g in self.postings), key=len)
+        counts = Counter()
+        for i, posting in enumerate(postings):
+            if i >= 3 and len(posting) > self.COMMON_POSTING:
+                break
+            counts.update(posting)
+        if not counts:
+            return None, 0.0
+        # Puntuación exacta (Dice) solo para los mejores candidatos
+        best = []
+        for i, _ in counts.most_common(8):
+            other = self.grams(self.keys[i])
+            best.append((2.0 * len(grams & other) / (len(grams) + len(other)), i))
+        best.sort(reverse=True)
+        score, index = best[0]
+        # Empate entre dos cartas distintas: no es fiable corregir
+        if len(best) > 1 and best[1][0] == score and self.names[best[1][1]] != self.names[index]:
+            return self.names[index], min(score, self.AUTO_SCORE - 0.01)
+        return self.names[index], score
+
+
+def image_candidates(set_name, card_id, thumbnails=False):
+    """Rutas posibles de la imagen de una carta dentro del ZIP de su set, por prioridad"""
+    if thumbnails:
+        return [
+            f"thumbnails/{card_id}.jpg",
+            f"thumbnails/{card_id}.JPG",
+            f"thumbnails/{card_id}.png",
+            f"thumbnails/{card_id}.PNG",
+            f"{set_name}/thumbnails/{card_id}.jpg",
+            f"{set_name}/thumbnails/{card_id}.JPG",
+            f"{set_name}/thumbnails/{card_id}.png",
+            f"{set_name}/thumbnails/{card_id}.PNG",
+        ]
+    return [
+        f"{set_name}/{card_id}.jpg",
+        f"{set_name}/{card_id}.JPG",
+        f"{set_name}/{card_id}.png",
+        f"{set_name}/{card_id}.PNG",
+        f"{set_name.lower()}/{card_id}.jpg",
+        f"{set_name.lower()}/{card_id}.png",
+        f"{card_id}.jpg",  # Algunos sets no tienen subcarpeta
+        f"{card_id}.JPG",
+        f"{card_id}.png",
+        f"{card_id}.PNG"
+    ]
+
+
+class SetArchivePool:
+    """Pool LRU de ZIPs de sets abiertos con un índice id -> miembro por set.
+
+    El índice se calcula una vez recorriendo el directorio central con las
+    mismas reglas de `image_candidates` y se guarda en disco (un JSON por set),
+    invalidado por fecha y tamaño del ZIP.
+    """
+
+    INDEX_VERSION = 1
+    RECHECK_SECONDS = 5.0  # Cada cuánto se vuelve a comprobar si el ZIP ha cambiado
+
+    def __init__(self, index_dir, max_open=8):
+        self.index_dir = index_dir
+        self.max_open = max_open
+        self._entries = OrderedDict()  # zip_path -> entrada abierta
+        self._lock = threading.Lock()
+        os.makedirs(index_dir, exist_ok=True)
+
+    @staticmethod
+    def _signature(zip_path):
+        st = os.stat(zip_path)
+        return [st.st_mtime_ns, st.st_size]
+
+    def _index_path(self, zip_path):
+        name = re.sub(r"[^\w.-]", "_", os.path.splitext(os.path.basename(zip_path))[0])
+        return os.path.join(self.index_dir, f"{name}.json")
+
+    def _load_index(self, zip_path, set_name, signature, zip_ref):
+        """Índice persistido si sigue siendo válido; si no, lo reconstruye y lo guarda"""
+        index_path = self._index_path(zip_path)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if (data.get("version") == self.INDEX_VERSION and data.get("zip") == os.path.abspath(zip_path)
+                    and data.get("set") == set_name and data.get("signature") == signature):
+                return data["full"], data["thumb"]
+        except (OSError, ValueError, KeyError):
+            pass
+        
+        start = time.perf_counter()
+        names = set(zip_ref.namelist())
+        card_ids = set()
+        for name in names:
+            match = re.search(r"(\d+)\.(?:jpg|png)$", name, re.IGNORECASE)
+            if match:
+                card_ids.add(match.group(1))
+        full, thumb = {}, {}
+        for card_id in card_ids:
+            for kind, table in ((False, full), (True, thumb)):
+                for path in image_candidates(set_name, card_id, kind):
+                    if path in names:
+                        table[card_id] = path
+                        break
+        try:
+            atomic_write_text(index_path, json.dumps({
+                "version": self.INDEX_VERSION, "zip": os.path.abspath(zip_path), "set": set_name,
+                "signature": signature, "full": full, "thumb": thumb}))
+        except OSError as e:
+            logging.warning(f"No se pudo guardar el índice de {zip_path}: {e}")
+        logging.info(f"Índice de {zip_path}: {len(full)} imágenes en {time.perf_counter() - start:.2f}s")
+        return full, thumb
+
+    def _entry(self, zip_path, set_name):
+        """Entrada abierta (ZIP + índice) para un set, reabriéndola si el ZIP cambió"""
+        with self._lock:
+            entry = self._entries.get(zip_path)
+            now = time.monotonic()
+            if entry is not None and entry["set"] == set_name:
+                if now - entry["checked_at"] < self.RECHECK_SECONDS:
+                    self._entries.move_to_end(zip_path)
+                    return entry
+                if self._signature(zip_path) == entry["signature"]:
+                    entry["checked_at"] = now
+                    self._entries.move_to_end(zip_path)
+                    return entry
+            if entry is not None:
+                self._close_entry(self._entries.pop(zip_path))
+            
+            signature = self._signature(zip_path)
+            zip_ref = zipfile.ZipFile(zip_path, 'r')
+            try:
+                full, thumb = self._load_index(zip_path, set_name, signature, zip_ref)
+            except Exception:
+                zip_ref.close()
+                raise
+            entry = {"zip": zip_ref, "set": set_name, "signature": signature, "checked_at": now,
+                     "full": full, "thumb": thumb, "lock": threading.Lock()}
+            self._entries[zip_path] = entry
+            while len(self._entries) > self.max_open:
+                _, old = self._entries.popitem(last=False)
+                self._close_entry(old)
+            return entry
+
+    @staticmethod
+    def _close_entry(entry):
+        with entry["lock"]:
+            entry["zip"].close()
+
+    def find_member(self, zip_path, set_name, card_id, thumbnail=False):
+        """Miembro del ZIP con la imagen de la carta (miniatura primero si se pide), o None"""
+        entry = self._entry(zip_path, set_name)
+        card_id = str(card_id)
+        if thumbnail and card_id in entry["thumb"]:
+            return entry["thumb"][card_id]
+        return entry["full"].get(card_id)
+
+    def card_ids(self, zip_path, set_name):
+        """Ids de todas las cartas con imagen (completa o miniatura) en el ZIP"""
+        entry = self._entry(zip_path, set_name)
+        return sorted(set(entry["full"]) | set(entry["thumb"]), key=int)
+
+    def read(self, zip_path, set_name, member):
+        """Bytes de un miembro usando el ZIP ya abierto"""
+        for _ in range(2):
+            entry = self._entry(zip_path, set_name)
+            with entry["lock"]:
+                # Si otro hilo lo cerró al expulsarlo del pool, se reabre
+                if entry["zip"].fp is not None:
+                    return entry["zip"].read(member)
+        raise ValueError(f"ZIP cerrado: {zip_path}")
+
+    def close_all(self):
+        with self._lock:
+            while self._entries:
+                _, entry = self._entries.popitem()
+                self._close_entry(entry)
+
+
+class SetArchiveIndex:
+    """Mapa nombre de set normalizado -> ZIP del set, construido recorriendo la carpeta de sets.
+
+    Se refresca en segundo plano comparando la fecha de modificación de las
+    carpetas, de modo que resolver el ZIP de una carta es una consulta a un
+    dict, sin llamadas al sistema de archivos.
+    """
+
+    RECHECK_SECONDS = 5.0
+
+    def __init__(self, sets_base_path):
+        self.sets_base_path = sets_base_path
+        self._archives = {}    # nombre normalizado -> (zip_path, carpeta del set)
+        self._dir_mtimes = {}  # carpeta del set -> (mtime_ns, zip_path o None)
+        self._base_mtime = None
+        self._checked_at = 0.0
+        self._refreshing = False
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(set_name):
+        return set_name.strip().casefold()
+
+    @staticmethod
+    def _pick_archive(set_name, files):
+        """ZIP del set dentro de su carpeta (mismas variaciones de nombre de siempre, sin distinguir mayúsculas)"""
+        zips = {name.lower(): name for name in files if name.lower().endswith(".zip")}
+        for candidate in (f"{set_name}.zip", f"{set_name.replace(' ', '_')}.zip",
+                          f"{set_name.replace(':', '')}.zip"):
+            if candidate.lower() in zips:
+                return zips[candidate.lower()]
+        return None
+
+    def refresh(self):
+        """Vuelve a leer solo las carpetas que cambiaron desde la última vez"""
+        start = time.perf_counter()
+        try:
+            base_mtime = os.stat(self.sets_base_path).st_mtime_ns
+            if base_mtime != self._base_mtime:
+                set_dirs = [d for d in os.listdir(self.sets_base_path)
+                            if os.path.isdir(os.path.join(self.sets_base_path, d))]
+            else:
+                set_dirs = list(self._dir_mtimes)
+            dir_mtimes, archives = {}, {}
+            for set_dir in set_dirs:
+                dir_path = os.path.join(self.sets_base_path, set_dir)
+                try:
+                    mtime = os.stat(dir_path).st_mtime_ns
+                    cached = self._dir_mtimes.get(set_dir)
+                    if cached and cached[0] == mtime:
+                        zip_path = cached[1]
+                    else:
+                        zip_name = self._pick_archive(set_dir, os.listdir(dir_path))
+                        zip_path = os.path.join(dir_path, zip_name) if zip_name else None
+                except OSError:
+                    continue
+                dir_mtimes[set_dir] = (mtime, zip_path)
+                if zip_path:
+                    archives[self.normalize(set_dir)] = (zip_path, set_dir)
+        except OSError as e:
+            if not self._ready.is_set():
+                logging.error(f"No se pudo leer la carpeta de sets {self.sets_base_path}: {e}")
+            self._ready.set()
+            return
+        
+        with self._lock:
+            first = self._base_mtime is None
+            self._archives = archives
+            self._dir_mtimes = dir_mtimes
+            self._base_mtime = base_mtime
+        if first:
+            if archives:
+                logging.info(f"Índice de sets: {len(archives)} sets con ZIP en {time.perf_counter() - start:.2f}s")
+            else:
+                logging.warning("No se encontraron sets en la carpeta de sets")
+        self._ready.set()
+
+    def refresh_async(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._checked_at = time.monotonic()
+        
+        def run():
+            try:
+                self.refresh()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+        
+        threading.Thread(target=run, daemon=True).start()
+
+    def archives(self):
+        """Pares (zip_path, carpeta del set) de todos los sets con ZIP"""
+        with self._lock:
+            return sorted(self._archives.values())
+
+    def is_ready(self):
+        """True en cuanto ha terminado el primer recorrido de la carpeta de sets"""
+        return self._ready.is_set()
+
+    def lookup(self, set_name, timeout=0):
+        """Ruta del ZIP de un set, o None.
+
+        Antes del primer recorrido devuelve None al momento, salvo que se pida
+        esperar hasta `timeout` segundos (solo desde hilos de fondo, nunca
+        desde el hilo de Tk).
+        """
+        if timeout:
+            self._ready.wait(timeout)
+        if time.monotonic() - self._checked_at > self.RECHECK_SECONDS:
+            self.refresh_async()
+        entry = self._archives.get(self.normalize(set_name))
+        return entry[0] if entry else None
+
+
+class ThumbnailDiskCache:
+    """Caché en disco de imágenes ya redimensionadas que sobrevive a los reinicios.
+
+    Cada archivo se nombra con el hash de (ZIP, fecha y tamaño del ZIP, carta,
+    tamaño destino), así que un ZIP modificado deja de coincidir con sus
+    entradas antiguas. Al superar el presupuesto se borran las entradas
+    usadas hace más tiempo. Si se indica pinned_dir (la salida de --prewarm),
+    también se leen de ahí, pero esas entradas nunca cuentan para el
+    presupuesto ni se recortan.
+    """
+
+    RECHECK_SECONDS = 5.0
+
+    def __init__(self, cache_dir, budget_bytes, pinned_dir=None):
+        self.cache_dir = cache_dir
+        self.pinned_dir = pinned_dir
+        self.budget_bytes = budget_bytes  # None: sin límite (pre-generación por lotes)
+        self.used_bytes = None  # Se calcula al primer recorte
+        self._signatures = {}   # zip_path -> (firma, momento de la comprobación)
+        self._trimming = False
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _archive_signature(self, zip_path):
+        now = time.monotonic()
+        cached = self._signatures.get(zip_path)
+        if cached and now - cached[1] < self.RECHECK_SECONDS:
+            return cached[0]
+        st = os.stat(zip_path)
+        signature = f"{st.st_mtime_ns}:{st.st_size}"
+        self._signatures[zip_path] = (signature, now)
+        return signature
+
+    def path_for(self, zip_path, card_id, size, base_dir=None):
+        """Ruta del archivo de caché (direccionada por contenido)"""
+        signature = self._archive_signature(zip_path)
+        raw = f"{os.path.abspath(zip_path)}|{signature}|{card_id}|{size[0]}x{size[1]}"
+        digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        return os.path.join(base_dir or self.cache_dir, digest[:2], f"{digest}.jpg")
+
+    def _candidate_paths(self, zip_path, card_id, size):
+        """Rutas donde puede estar una entrada: primero la pre-generada, luego la recortable"""
+        if self.pinned_dir:
+            yield self.path_for(zip_path, card_id, size, self.pinned_dir), True
+        yield self.path_for(zip_path, card_id, size), False
+
+    def contains(self, zip_path, card_id, size):
+        return any(os.path.exists(path) for path, _ in self._candidate_paths(zip_path, card_id, size))
+
+    def read_bytes(self, zip_path, card_id, size):
+        """Bytes JPEG de una entrada, o None"""
+        for path, _ in self._candidate_paths(zip_path, card_id, size):
+            try:
+                with open(path, 'rb') as f:
+                    return f.read()
+            except OSError:
+                continue
+        return None
+
+    def get(self, zip_path, card_id, size):
+        """Imagen PIL cacheada, o None"""
+        for path, pinned in self._candidate_paths(zip_path, card_id, size):
+            try:
+                img = Image.open(path)
+                img.load()
+                if not pinned:
+                    os.utime(path)  # Marca de uso para la expulsión LRU
+                return img
+            except (OSError, ValueError):
+                continue
+        return None
+
+    def put(self, zip_path, card_id, size, img):
+        """Guarda una imagen ya redimensionada"""
+        try:
+            path = self.path_for(zip_path, card_id, size)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            img.convert('RGB').save(tmp_path, format='JPEG', quality=90)
+            os.replace(tmp_path, path)
+            with self._lock:
+                if self.used_bytes is not None:
+                    self.used_bytes += os.path.getsize(path)
+                over = self.budget_bytes is not None and (
+                    self.used_bytes is None or self.used_bytes > self.budget_bytes)
+            if over:
+                self.trim_async()
+        except OSError as e:
+            logging.warning(f"No se pudo guardar la miniatura en caché: {e}")
+
+    def trim_async(self):
+        with self._lock:
+            if self._trimming:
+                return
+            self._trimming = True
+        threading.Thread(target=self._trim, daemon=True).start()
+
+    def _trim(self):
+        """Borra las entradas menos usadas hasta quedar por debajo del 90% del presupuesto"""
+        try:
+            entries, total = [], 0
+            for root_dir, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    path = os.path.join(root_dir, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+                    total += st.st_size
+            if self.budget_bytes is not None and total > self.budget_bytes:
+                entries.sort()
+                target = self.budget_bytes * 0.9
+                for _, size, path in entries:
+                    if total <= target:
+                        break
+                    try:
+                        os.unlink(path)
+                        total -= size
+                    except OSError:
+                        pass
+                logging.info(f"Caché de miniaturas recortada a {total // (1024 * 1024)} MB")
+            with self._lock:
+                self.used_bytes = total
+        finally:
+            with self._lock:
+                self._trimming = False
+
+
+class ThumbnailAtlas:
+    """Un archivo por set con todas sus miniaturas ya redimensionadas, leído con mmap.
+
+    Formato: MAGIC, longitud del índice (uint32 LE), índice JSON (firma del
+    ZIP y card_id -> [offset, longitud]) y a continuación los JPEG seguidos.
+    Cada miniatura se obtiene cortando el mapa en memoria, sin abrir un
+    archivo por carta. El atlas deja de usarse si el ZIP cambia de fecha o
+    tamaño.
+    """
+
+    MAGIC = b"WCMATLS1"
+    RECHECK_SECONDS = 5.0
+
+    def __init__(self, atlas_dir, size=THUMBNAIL_SIZE):
+        self.atlas_dir = atlas_dir
+        self.size = tuple(size)
+        self._maps = {}  # zip_path -> atlas abierto (o None si no hay uno válido)
+        self._lock = threading.Lock()
+        os.makedirs(atlas_dir, exist_ok=True)
+
+    def _atlas_path(self, zip_path):
+        name = re.sub(r"[^\w.-]", "_", os.path.splitext(os.path.basename(zip_path))[0])
+        return os.path.join(self.atlas_dir, f"{name}.atlas")
+
+    @staticmethod
+    def _close(atlas):
+        if atlas and atlas["map"] is not None:
+            atlas["map"].close()
+
+    def _load(self, zip_path, signature):
+        """Abre y valida el atlas de un ZIP; None si no existe o está obsoleto"""
+        try:
+            with open(self._atlas_path(zip_path), 'rb') as f:
+                header = f.read(len(self.MAGIC) + 4)
+                if len(header) < len(self.MAGIC) + 4 or header[:len(self.MAGIC)] != self.MAGIC:
+                    return None
+                index_len, = struct.unpack("<I", header[len(self.MAGIC):])
+                index = json.loads(f.read(index_len).decode('utf-8'))
+                if (index.get("zip") != os.path.abspath(zip_path) or index.get("signature") != signature
+                        or tuple(index.get("size", ())) != self.size):
+                    return None
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, struct.error):
+            return None
+        return {"map": mapped, "signature": signature, "entries": index["entries"],
+                "data_start": len(self.MAGIC) + 4 + index_len}
+
+    def _atlas(self, zip_path):
+        with self._lock:
+            now = time.monotonic()
+            atlas = self._maps.get(zip_path)
+            if atlas is not None and now - atlas["checked_at"] < self.RECHECK_SECONDS:
+                return atlas if atlas["map"] is not None else None
+            signature = SetArchivePool._signature(zip_path)
+            if atlas is None or atlas["signature"] != signature:
+                self._close(atlas)
+                atlas = self._load(zip_path, signature) or {"map": None, "signature": signature}
+                self._maps[zip_path] = atlas
+            atlas["checked_at"] = now
+            return atlas if atlas["map"] is not None else None
+
+    def is_current(self, zip_path):
+        """True si hay un atlas válido para la versión actual del ZIP"""
+        return self._atlas(zip_path) is not None
+
+    def get(self, zip_path, card_id):
+        """Miniatura PIL desde el atlas, o None"""
+        atlas = self._atlas(zip_path)
+        if atlas is None:
+            return None
+        entry = atlas["entries"].get(str(card_id))
+        if entry is None:
+            return None
+        start = atlas["data_start"] + entry[0]
+        try:
+            img = Image.open(io.BytesIO(atlas["map"][start:start + entry[1]]))
+            img.load()
+            return img
+        except (OSError, ValueError):
+            return None  # Mapa cerrado por una reconstrucción o datos dañados
+
+    def build(self, archive_pool, disk_cache, zip_path, set_name, partial=False):
+        """Empaqueta en un atlas las miniaturas de un ZIP que ya están en la caché en disco.
+
+        Nunca decodifica imágenes: solo copia los JPEG ya generados. Si falta
+        alguna y partial es False (el caso de la aplicación) no escribe nada;
+        la pre-generación usa partial=True para saltarse las cartas sin
+        imagen. Devuelve el número de miniaturas empaquetadas, o None si no
+        se ha escrito ningún atlas.
+        """
+        if self.is_current(zip_path):
+            return None
+        start = time.perf_counter()
+        signature = SetArchivePool._signature(zip_path)
+        entries, chunks, offset = {}, [], 0
+        for card_id in archive_pool.card_ids(zip_path, set_name):
+            data = disk_cache.read_bytes(zip_path, card_id, self.size)
+            if data is None:
+                if not partial:
+                    return None
+                continue
+            entries[card_id] = [offset, len(data)]
+            chunks.append(data)
+            offset += len(data)
+        
+        index = json.dumps({"zip": os.path.abspath(zip_path), "signature": signature,
+                            "size": list(self.size), "entries": entries}).encode('utf-8')
+        atlas_path = self._atlas_path(zip_path)
+        tmp_path = f"{atlas_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(self.MAGIC + struct.pack("<I", len(index)) + index)
+                f.writelines(chunks)
+            with self._lock:
+                # En Windows no se puede reemplazar un archivo mapeado
+                self._close(self._maps.pop(zip_path, None))
+                os.replace(tmp_path, atlas_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        logging.info(f"Atlas de {set_name}: {len(entries)} miniaturas, {offset // 1024} KB "
+                     f"en {time.perf_counter() - start:.1f}s")
+        return len(entries)
+
+    def close_all(self):
+        with self._lock:
+            for atlas in self._maps.values():
+                self._close(atlas)
+            self._maps.clear()
+
+
+def fit_size(width, height, box):
+    """Tamaño que cabe en `box` manteniendo la relación de aspecto"""
+    ratio = min(box[0] / width, box[1] / height)
+    return (int(width * ratio), int(height * ratio))
+
+
+def load_resized_image(archive_pool, disk_cache, zip_path, set_name, card_id, size, thumbnail=False,
+                       quality="high"):
+    """Imagen PIL de una carta ajustada a `size`: de la caché en disco o del ZIP del set.
+
+    Con thumbnail=True se prefieren las miniaturas del propio ZIP, que se usan
+    tal cual. Los JPEG se decodifican ya reducidos (draft) y después se
+    ajustan con el filtro de `quality`; solo las imágenes "high" se guardan
+    en la caché en disco. Devuelve None si la carta no tiene imagen en el ZIP.
+    """
+    img = disk_cache.get(zip_path, card_id, size)
+    if img is not None:
+        return img
+    member = archive_pool.find_member(zip_path, set_name, card_id, thumbnail=thumbnail)
+    if not member:
+        return None
+    as_is = thumbnail and "thumbnails" in member
+    resample, headroom = IMAGE_QUALITY[quality]
+    # El ZIP solo queda bloqueado mientras se leen los bytes comprimidos; la
+    # decodificación y el redimensionado no frenan a otros hilos del mismo set
+    img = Image.open(io.BytesIO(archive_pool.read(zip_path, set_name, member)))
+    if not as_is:
+        # El decodificador JPEG escala por 1/2, 1/4 o 1/8 sin bajar de lo pedido
+        img.draft('RGB', (size[0] * headroom, size[1] * headroom))
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGB')
+    if as_is:
+        img.load()
+    else:
+        # reducing_gap reduce primero por bloques (rápido) y deja el filtro para el final
+        img = img.resize(fit_size(img.width, img.height, size), resample, reducing_gap=2.0 * headroom)
+    if as_is or quality == "high":
+        disk_cache.put(zip_path, card_id, size, img)
+    return img
+
+
+# Estado de cada proceso de la pre-generación (ZIPs abiertos y caché en disco)
+_prewarm_state = None
+
+
+def _prewarm_init(cache_dir):
+    global _prewarm_state
+    _prewarm_state = (SetArchivePool(os.path.join(cache_dir, "zip_index")),
+                      ThumbnailDiskCache(os.path.join(cache_dir, "prewarm"), None),
+                      ThumbnailAtlas(os.path.join(cache_dir, "atlas")))
+
+
+def _prewarm_chunk(zip_path, set_name, card_ids, sizes):
+    """Genera en la caché las imágenes de un bloque de cartas; devuelve (nuevas, existentes, fallidas)"""
+    archive_pool, disk_cache, _ = _prewarm_state
+    created = skipped = failed = 0
+    for card_id in card_ids:
+        for size in sizes:
+            try:
+                if disk_cache.contains(zip_path, card_id, size):
+                    skipped += 1
+                elif load_resized_image(archive_pool, disk_cache, zip_path, set_name, card_id,
+                                        size, thumbnail=size == THUMBNAIL_SIZE) is not None:
+                    created += 1
+                else:
+                    failed += 1
+            except Exception as e:
+                logging.debug(f"No se pudo generar {set_name}/{card_id}: {e}")
+                failed += 1
+    archive_pool.close_all()
+    return created, skipped, failed
+
+
+def _prewarm_atlas(zip_path, set_name):
+    """Empaqueta las miniaturas ya generadas de un set en su atlas"""
+    archive_pool, disk_cache, atlas = _prewarm_state
+    atlas.build(archive_pool, disk_cache, zip_path, set_name, partial=True)
+    atlas.close_all()
+    archive_pool.close_all()
+
+
+def prewarm_thumbnails(sets_base_path, cache_dir, sizes=(THUMBNAIL_SIZE,), workers=None):
+    """Pre-genera las imágenes redimensionadas de todos los sets con un pool de procesos.
+
+    Escribe en un directorio propio (cache/prewarm) con el mismo formato y
+    las mismas reglas de búsqueda dentro del ZIP que la caché de la
+    aplicación. La aplicación lo lee pero no lo recorta, así que lo generado
+    no se borra por el presupuesto de la caché normal. Las miniaturas ya
+    generadas se saltan: si se interrumpe, al volver a lanzarlo continúa
+    donde lo dejó.
+    """
+    start = time.perf_counter()
+    archive_pool = SetArchivePool(os.path.join(cache_dir, "zip_index"))
+    jobs, archives, total = [], [], 0
+    # El índice de cada ZIP se construye aquí una sola vez y los procesos lo leen de disco
+    set_archives = SetArchiveIndex(sets_base_path)
+    set_archives.refresh()
+    for zip_path, set_name in set_archives.archives():
+        try:
+            card_ids = archive_pool.card_ids(zip_path, set_name)
+        except (OSError, zipfile.BadZipFile) as e:
+            logging.error(f"No se pudo leer {zip_path}: {e}")
+            continue
+        finally:
+            archive_pool.close_all()
+        archives.append((zip_path, set_name))
+        for i in range(0, len(card_ids), PREWARM_CHUNK_SIZE):
+            jobs.append((zip_path, set_name, card_ids[i:i + PREWARM_CHUNK_SIZE]))
+        total += len(card_ids) * len(sizes)
+    logging.info(f"Pre-generación: {total} imágenes en {len(jobs)} bloques")
+    
+    created = skipped = failed = processed = 0
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_prewarm_init, initargs=(cache_dir,))
+    try:
+        futures = {executor.submit(_prewarm_chunk, zip_path, set_name, card_ids, sizes): len(card_ids)
+                   for zip_path, set_name, card_ids in jobs}
+        for future in as_completed(futures):
+            processed += futures[future] * len(sizes)
+            try:
+                c, s, f = future.result()
+                created, skipped, failed = created + c, skipped + s, failed + f
+            except Exception as e:
+                logging.error(f"Error en un bloque de la pre-generación: {e}")
+                failed += futures[future] * len(sizes)
+            logging.info(f"Pre-generación: {processed}/{total} ({processed * 100 // max(total, 1)}%) - "
+                         f"{created} nuevas, {skipped} ya en caché, {failed} sin imagen")
+        
+        # Con todas las miniaturas en caché, empaquetar un atlas por set
+        if THUMBNAIL_SIZE in sizes:
+            futures = {executor.submit(_prewarm_atlas, zip_path, set_name): set_name
+                       for zip_path, set_name in archives}
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"No se pudo crear el atlas de {futures[future]}: {e}")
+                logging.info(f"Atlas: {done}/{len(futures)} sets")
+        executor.shutdown()
+    except KeyboardInterrupt:
+        executor.shutdown(wait=True, cancel_futures=True)
+        logging.warning("Pre-generación interrumpida; se reanudará en la próxima ejecución")
+        raise
+    
+    logging.info(f"Pre-generación terminada en {time.perf_counter() - start:.1f}s: "
+                 f"{created} nuevas, {skipped} ya en caché, {failed} sin imagen")
+    return created, skipped, failed
+
+
+class ImageCache:
+    """Caché LRU de PhotoImage compartida por todos los paneles.
+
+    La clave es (set, id de carta, tamaño) y el tamaño de cada entrada se
+    estima en bytes (ancho * alto * 4); al superar el presupuesto se expulsan
+    las menos usadas. Los widgets que muestran la misma carta reciben el mismo
+    PhotoImage.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(set_name, card_id, size):
+        return (set_name, str(card_id), tuple(size))
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key, photo):
+        nbytes = photo.width() * photo.height() * 4
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.used_bytes -= old[1]
+            self._items[key] = (photo, nbytes)
+            self.used_bytes += nbytes
+            while self.used_bytes > self.budget_bytes and len(self._items) > 1:
+                _, (_, freed) = self._items.popitem(last=False)
+                self.used_bytes -= freed
+        return photo
+
+
+class ImageLoaderPool:
+    """Pool fijo de hilos para cargar imágenes, con prioridad y cancelación por grupo.
+
+    Se atienden antes los trabajos de menor prioridad. Cada trabajo tiene una
+    clave (p. ej. el widget que lo va a mostrar) para poder cancelarlo o
+    sustituirlo mientras espera, y un grupo (p. ej. la ventana) cuyos
+    trabajos pendientes se cancelan de una vez.
+    """
+
+    def __init__(self, workers=THUMB_LOADER_WORKERS):
+        self.workers = workers
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._pending = {}  # clave -> trabajo en cola
+        self._active = 0    # Trabajos ejecutándose
+        self._threads = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def submit(self, fn, priority=0, group=None, key=None):
+        """Encola `fn` (se ejecuta en un hilo del pool)"""
+        with self._lock:
+            if self._closed:
+                return
+            if key is None:
+                key = ("job", next(self._seq))
+            old = self._pending.get(key)
+            if old is not None:
+                old["cancelled"] = True
+            job = {"fn": fn, "priority": priority, "group": group, "key": key, "cancelled": False}
+            self._pending[key] = job
+            self._queue.put((priority, next(self._seq), job))
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def cancel(self, key):
+        """Descarta el trabajo pendiente con esa clave, si lo hay"""
+        with self._lock:
+            job = self._pending.pop(key, None)
+            if job is not None:
+                job["cancelled"] = True
+
+    def cancel_group(self, group):
+        """Descarta los trabajos pendientes de un grupo"""
+        with self._lock:
+            for key, job in list(self._pending.items()):
+                if job["group"] is group:
+                    job["cancelled"] = True
+                    del self._pending[key]
+
+    def _run(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job["cancelled"] or self._pending.get(job["key"]) is not job:
+                    continue
+                del self._pending[job["key"]]
+                self._active += 1
+            try:
+                job["fn"]()
+            except Exception:
+                logging.exception("Error en el pool de carga de imágenes")
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+    def busy(self):
+        """True si quedan trabajos en cola o ejecutándose"""
+        with self._lock:
+            return bool(self._pending) or self._active > 0
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._pending.clear()
+            for _ in self._threads:
+                self._queue.put((float("-inf"), next(self._seq), None))
+
+
+def tree_sort_key(column):
+    """Función que convierte el valor de una celda en una clave de orden tipada"""
+    if column in NUMERIC_SORT_COLUMNS:
+        # Números primero y en orden numérico; lo que no sea número, detrás por texto
+        return lambda value: (0, int(value), "") if str(value).isdigit() else (1, 0, str(value).casefold())
+    if column == "Mana":
+        return lambda value: (mana_value(str(value)), str(value))
+    return lambda value: str(value).casefold()
+
+
+class TreeRowModel:
+    """Filas de un Treeview en Python (iid -> valores) con las claves de orden en caché.
+
+    Ordenar no necesita leer nada del árbol: las claves se calculan una vez
+    por fila y columna, y se invalidan solo para las filas que cambian.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self._keys = {}  # columna -> {iid: clave}
+
+    def clear(self):
+        self.rows.clear()
+        self._keys.clear()
+
+    def set(self, iid, values):
+        self.rows[iid] = values
+        for keys in self._keys.values():
+            keys.pop(iid, None)
+
+    def remove(self, iid):
+        self.rows.pop(iid, None)
+        for keys in self._keys.values():
+            keys.pop(iid, None)
+
+    def sort_keys(self, column, index):
+        keys = self._keys.setdefault(column, {})
+        if len(keys) != len(self.rows):
+            key = tree_sort_key(column)
+            for iid, values in self.rows.items():
+                if iid not in keys:
+                    keys[iid] = key(values[index] if index < len(values) else "")
+        return keys
+
+    def sorted_iids(self, order, columns):
+        """iids ordenados por varias columnas [(columna, descendente)], de forma estable"""
+        iids = list(self.rows)
+        # Ordenación estable: de la columna menos importante a la principal
+        for column, reverse in reversed(order):
+            keys = self.sort_keys(column, columns.index(column))
+            iids.sort(key=keys.__getitem__, reverse=reverse)
+        return iids
+
+
+class TreePopulator:
+    """Rellena un Treeview por bloques programados con `after()` sin bloquear la interfaz.
+
+    Cada bloque inserta filas hasta agotar TREE_CHUNK_BUDGET_MS. Una nueva
+    llamada a `populate` cancela la que estuviera en curso.
+    """
+
+    def __init__(self, tree, on_progress=None, iid_column=None, model=None):
+        self.tree = tree
+        self.model = model              # TreeRowModel que se mantiene al día con las filas insertadas
+        self.on_progress = on_progress  # on_progress(insertadas, total)
+        self.iid_column = iid_column    # Columna cuyo valor se usa como id del item
+
+        self._after_id = None
+        self._rows = []
+        self._pos = 0
+        self._on_done = None
+
+    @property
+    def busy(self):
+        return self._after_id is not None
+
+    def pending_rows(self):
+        """Filas que aún no se han insertado"""
+        return self._rows[self._pos:]
+
+    def populate(self, rows, on_done=None):
+        """Sustituye el contenido del árbol por `rows` (tuplas de valores)"""
+        self.cancel()
+        self.tree.delete(*self.tree.get_children())
+        if self.model is not None:
+            self.model.clear()
+        self._rows = rows
+        self._pos = 0
+        self._on_done = on_done
+        self._step()
+
+    def cancel(self):
+        if self._after_id is not None:
+            self.tree.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _step(self):
+        self._after_id = None
+        deadline = time.perf_counter() + TREE_CHUNK_BUDGET_MS / 1000
+        tree, rows = self.tree, self._rows
+        iid_column, model = self.iid_column, self.model
+        while self._pos < len(rows):
+            values = rows[self._pos]
+            iid = tree.insert('', tk.END, iid=None if iid_column is None else str(values[iid_column]), values=values)
+            if model is not None:
+                model.set(iid, values)
+            self._pos += 1
+            if self._pos % 64 == 0 and time.perf_counter() >= deadline:
+                break
+        if self._pos < len(rows):
+            if self.on_progress:
+                self.on_progress(self._pos, len(rows))
+            self._after_id = tree.after(1, self._step)
+            return
+        total, on_done = len(rows), self._on_done
+        self._rows, self._on_done = [], None
+        if self.on_progress and total > 64:
+            self.on_progress(total, total)
+        if on_done:
+            on_done()
+
+
+class WriteBehindSaver:
+    """Guarda archivos en segundo plano agrupando las ráfagas de cambios.
+
+    `schedule(path, producer)` programa la escritura para cuando pasen
+    SAVE_DELAY_MS sin más cambios; el contenido lo genera `producer()` en el
+    hilo principal en ese momento y un hilo lo escribe con atomic_write_text.
+    `write(path, text)` es el guardado explícito: pasa por el mismo hilo, así
+    que nunca se cruza con uno diferido del mismo archivo.
+    """
+
+    def __init__(self, root, delay_ms=SAVE_DELAY_MS, on_error=None):
+        self.root = root
+        self.delay_ms = delay_ms
+        self.on_error = on_error  # on_error(path, excepción), en el hilo principal
+        self._pending = {}  # path -> producer
+        self._after_id = None
+        self._queue = queue.Queue()
+        self._errors = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def schedule(self, path, producer):
+        self._pending[path] = producer
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+        self._after_id = self.root.after(self.delay_ms, self._fire)
+
+    def discard(self, path):
+        """Olvida la escritura pendiente de un archivo (p. ej. antes de borrarlo)"""
+        self._pending.pop(path, None)
+
+    def write(self, path, text):
+        """Escribe ya un archivo desde el hilo de escritura y espera; relanza el error si falla"""
+        self.discard(path)
+        done = {"event": threading.Event(), "error": None}
+        self._queue.put((path, text, done))
+        done["event"].wait()
+        if done["error"] is not None:
+            raise done["error"]
+
+    def _fire(self):
+        self._after_id = None
+        pending, self._pending = self._pending, {}
+        for path, producer in pending.items():
+            try:
+                self._queue.put((path, producer(), None))
+            except Exception as e:
+                logging.error(f"No se pudo preparar el guardado de {path}: {e}")
+        if pending:
+            self.root.after(self.delay_ms, self._report_errors)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                path, text, done = item
+                error = None
+                try:
+                    atomic_write_text(path, text)
+                    logging.debug(f"Guardado en segundo plano: {path}")
+                except Exception as e:
+                    # Cualquier fallo (también de codificación) se informa sin parar el hilo
+                    logging.error(f"Error al guardar {path}: {e}")
+                    error = e
+                finally:
+                    if done is not None:
+                        done["error"] = error  # Lo muestra quien pidió el guardado
+                        done["event"].set()
+                    elif error is not None:
+                        self._errors.put((path, error))
+            finally:
+                self._queue.task_done()
+
+    def _report_errors(self):
+        while True:
+            try:
+                path, error = self._errors.get_nowait()
+            except queue.Empty:
+                return
+            if self.on_error:
+                self.on_error(path, error)
+
+    def flush(self):
+        """Escribe ya todo lo pendiente y espera a que termine"""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+        self._fire()
+        self._queue.join()
+        self._report_errors()
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
 class WagicCollectionManager:
     def __init__(self, root):
         self.root = root
@@ -111,8 +1849,10 @@ class WagicCollectionManager:
         
         # Rutas especificadas
         self.db_path = 'cards.db'
-        self.sets_base_path = 'User\\sets'
+        self.sets_base_path = SETS_BASE_PATH
         self.collection_path = 'User\\player\\collection.dat'
+        # Copia de trabajo compacta; collection.dat (el de Wagic) solo se escribe al exportar
+        self.collection_counts_path = os.path.join(os.path.dirname(self.collection_path), 'collection_counts.dat')
         self.decks_path = 'User\\player'  # Nueva ruta para decks
         
         # Configurar estilo oscuro
@@ -124,6 +1864,54 @@ class WagicCollectionManager:
         # Conectar a la base de datos
         self.conn = sqlite3.connect(self.db_path)
         self.cursor = self.conn.cursor()
+        self.ensure_indexes()
+        
+        # Índice de texto completo para las búsquedas (se construye en segundo plano)
+        self.search_index = CardSearchIndex(self.db_path)
+        self.search_index.attach(self.conn)
+        
+        # ZIP de cada set (se busca una vez en segundo plano y se refresca por fecha de carpeta)
+        self.set_archives = SetArchiveIndex(self.sets_base_path)
+        self.set_archives.refresh_async()
+        
+        # ZIPs de sets abiertos e índice persistente de sus imágenes
+        self.archive_pool = SetArchivePool(os.path.join(CACHE_DIR, "zip_index"))
+        self.thumb_cache = ThumbnailDiskCache(os.path.join(CACHE_DIR, "thumbs"),
+                                              THUMB_CACHE_BUDGET_MB * 1024 * 1024,
+                                              pinned_dir=os.path.join(CACHE_DIR, "prewarm"))
+        self.thumb_atlas = ThumbnailAtlas(os.path.join(CACHE_DIR, "atlas"))
+        
+        # Imágenes ya decodificadas, compartidas entre pestañas y spoiler
+        self.image_cache = ImageCache(IMAGE_CACHE_BUDGET_MB * 1024 * 1024)
+        self.thumb_loader = ImageLoaderPool()
+        # Imágenes PIL decodificadas por los hilos, pendientes de pasar a PhotoImage
+        self._decoded_images = queue.Queue()
+        self._image_drain_id = None
+        self._prefetch_last = {}  # árbol -> índice de la última fila seleccionada
+        self._shown_image = {}    # panel de imagen -> (card_id, set_name) pedido por última vez
+        self._populators = {}     # árbol -> TreePopulator
+        self._tree_models = {}    # árbol -> TreeRowModel
+        self._tree_sort = {}      # árbol -> [(columna, descendente), ...] elegido por el usuario
+        
+        # Guardado diferido de colección y decks (agrupa ráfagas de clics)
+        self.saver = WriteBehindSaver(
+            self.root, on_error=lambda path, e: messagebox.showerror("Error", f"No se pudo guardar {path}:\n{e}"))
+        
+        # Catálogo de cartas en memoria (se carga en segundo plano)
+        self.catalog = CardCatalog(self.db_path)
+        self.catalog.load_async()
+        self.search_worker = SearchWorker(
+            self.db_path, self.search_index,
+            ("id", "nombre", "mana", "set_nombre", "rarity", "tipo", "subtipo", "texto", "rowid"),
+            SEARCH_PAGE_SIZE)
+        self._search_after_id = None
+        self._search_poll_id = None
+        self._last_search_query = None
+        self._search_explicit = False
+        self._search_after_key = None   # (nombre, rowid) de la última fila mostrada
+        self._search_loading = False
+        self._search_total = 0
+        self._search_shown = 0
         
         # Crear widgets
         self.create_widgets()
@@ -249,33 +2037,16 @@ class WagicCollectionManager:
             messagebox.showerror("Error", f"Carpeta de sets no encontrada:\n{self.sets_base_path}")
             return
         
-        # Verificar archivo de colección
-        if not os.path.exists(self.collection_path):
-            logging.info(f"Creando archivo de colección: {self.collection_path}")
-            os.makedirs(os.path.dirname(self.collection_path), exist_ok=True)
-            open(self.collection_path, 'w').close()
+        # Carpeta de la colección (collection.dat no se crea: solo se escribe al exportar)
+        collection_dir = os.path.dirname(self.collection_path)
+        if not os.path.exists(collection_dir):
+            logging.info(f"Creando carpeta de la colección: {collection_dir}")
+            os.makedirs(collection_dir, exist_ok=True)
         
         # Verificar carpeta de decks
         if not os.path.exists(self.decks_path):
             logging.info(f"Creando carpeta de decks: {self.decks_path}")
             os.makedirs(self.decks_path, exist_ok=True)
-        
-        # Buscar un set de ejemplo
-        example_set = None
-        for d in os.listdir(self.sets_base_path):
-            dir_path = os.path.join(self.sets_base_path, d)
-            if os.path.isdir(dir_path):
-                example_set = d
-                break
-        
-        if example_set:
-            zip_path = os.path.join(self.sets_base_path, example_set, f"{example_set}.zip")
-            if not os.path.exists(zip_path):
-                logging.warning(f"Archivo ZIP no encontrado para set de ejemplo: {zip_path}")
-            else:
-                logging.info(f"Set de ejemplo encontrado: {zip_path}")
-        else:
-            logging.warning("No se encontraron sets en la carpeta de sets")
 
     def test_image_display(self):
         """Función para probar la visualización de imágenes automáticamente"""
@@ -289,8 +2060,8 @@ class WagicCollectionManager:
                 logging.info(f"Probando visualización de imagen para carta: {name} [{mana}] (ID: {card_id}, Set: {set_name})")
                 
                 # Mostrar en la interfaz
-                self.result_tree.delete(*self.result_tree.get_children())
-                self.result_tree.insert('', tk.END, values=(card_id, name, mana, set_name, rarity))
+                self.clear_tree(self.result_tree)
+                self.insert_tree_row(self.result_tree, (card_id, name, mana, set_name, rarity))
                 if self.result_tree.get_children():
                     self.result_tree.selection_set(self.result_tree.get_children()[0])
                     self.result_tree.focus_set()
@@ -344,6 +2115,7 @@ class WagicCollectionManager:
         self.search_entry = ttk.Entry(search_frame)
         self.search_entry.grid(row=0, column=1, padx=5, sticky=tk.EW)
         self.search_entry.bind('<Return>', lambda e: self.search_cards())
+        self.search_entry.bind('<KeyRelease>', self.on_search_key)
         
         # Botón de búsqueda
         ttk.Button(search_frame, text=LANG["button_search"], command=self.search_cards).grid(row=0, column=2, padx=5)
@@ -378,12 +2150,13 @@ class WagicCollectionManager:
         col_widths = [80, 250, 100, 80, 150]  # Nuevo ancho para la columna Tipo
         for col, width in zip(columns, col_widths):
             self.result_tree.heading(col, text=col, 
-                                   command=lambda c=col: self.sort_treeview(self.result_tree, c, False))
+                                   command=lambda c=col: self.sort_treeview(self.result_tree, c))
             self.result_tree.column(col, width=width, minwidth=50)
+        self.enable_multi_sort(self.result_tree)
         
-        # Scrollbar vertical
-        vsb = ttk.Scrollbar(left_frame, orient=tk.VERTICAL, command=self.result_tree.yview)
-        self.result_tree.configure(yscrollcommand=vsb.set)
+        # Scrollbar vertical (pide más resultados al acercarse al final)
+        self.result_vsb = ttk.Scrollbar(left_frame, orient=tk.VERTICAL, command=self.result_tree.yview)
+        self.result_tree.configure(yscrollcommand=self.on_result_scroll)
         
         # Scrollbar horizontal
         hsb = ttk.Scrollbar(left_frame, orient=tk.HORIZONTAL, command=self.result_tree.xview)
@@ -391,7 +2164,7 @@ class WagicCollectionManager:
         
         # Layout
         self.result_tree.grid(row=0, column=0, sticky=tk.NSEW)
-        vsb.grid(row=0, column=1, sticky=tk.NS)
+        self.result_vsb.grid(row=0, column=1, sticky=tk.NS)
         hsb.grid(row=1, column=0, sticky=tk.EW)
         
         left_frame.columnconfigure(0, weight=1)
@@ -461,6 +2234,8 @@ class WagicCollectionManager:
         ttk.Button(controls_frame, text=LANG["button_clear"], command=self.clear_collection).pack(side=tk.LEFT, padx=5)
         ttk.Button(controls_frame, text=LANG["button_open_file"], 
                   command=self.open_collection_file).pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls_frame, text=LANG["button_export_wagic"], 
+                  command=self.export_collection_for_wagic).pack(side=tk.LEFT, padx=5)
         ttk.Button(controls_frame, text=LANG["button_import_deck"], 
                   command=self.import_deck).pack(side=tk.LEFT, padx=5)
         
@@ -486,8 +2261,9 @@ class WagicCollectionManager:
         col_widths = [80, 300, 150, 80]
         for col, width in zip(columns, col_widths):
             self.collection_tree.heading(col, text=col, 
-                                       command=lambda c=col: self.sort_treeview(self.collection_tree, c, False))
+                                       command=lambda c=col: self.sort_treeview(self.collection_tree, c))
             self.collection_tree.column(col, width=width, minwidth=50)
+        self.enable_multi_sort(self.collection_tree)
         
         # Scrollbar vertical
         vsb = ttk.Scrollbar(left_frame, orient=tk.VERTICAL, command=self.collection_tree.yview)
@@ -548,7 +2324,12 @@ class WagicCollectionManager:
         self.remove_all_button.pack(side=tk.LEFT, padx=5, expand=True, fill=tk.X)
         
     def show_deck_spoiler(self):
-        """Muestra un spoiler visual del deck actual similar a deckstats.net"""
+        """Muestra un spoiler visual del deck actual similar a deckstats.net.
+
+        Todo se dibuja en un único Canvas: solo existen items para las cartas
+        visibles y se reutilizan al desplazarse, así que el coste de abrirlo
+        no depende del tamaño del deck.
+        """
         if not hasattr(self, 'deck_cards') or not self.deck_cards:
             messagebox.showinfo("Info", "No deck loaded or deck is empty")
             return
@@ -561,123 +2342,181 @@ class WagicCollectionManager:
         spoiler_win.grab_set()
         
         # Frame principal con scrollbar
-        main_frame = ttk.Frame(spoiler_win)
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        canvas = tk.Canvas(main_frame, bg=THEME_DARK)
-        scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-        
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-        
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
+        main_frame = ttk.Frame(spoiler_win)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        main_frame.pack(fill=tk.BOTH, expand=True)
+        canvas = tk.Canvas(main_frame, bg=THEME_DARK, highlightthickness=0, yscrollincrement=30)
+        scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=lambda *args: on_scrollbar(*args))
         canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # Todos los datos del deck en una sola consulta (o desde el catálogo)
+        try:
+            deck_details = self.get_cards(self.deck_cards.keys())
+        except sqlite3.Error as e:
+            logging.error(f"Error al obtener las cartas del deck: {e}")
+            deck_details = {}
+        
         # Agrupar cartas por tipo (Creature, Instant, Sorcery, Land, etc.)
         card_groups = {}
         for card_id, quantity in self.deck_cards.items():
-            try:
-                self.cursor.execute("SELECT tipo FROM cartas WHERE id = ?", (card_id,))
-                card_type = self.cursor.fetchone()[0]
-                
-                # Simplificar tipo para agrupación
-                if "Creature" in card_type:
-                    group = "Creatures"
-                elif "Land" in card_type:
-                    group = "Lands"
-                elif "Instant" in card_type or "Sorcery" in card_type:
-                    group = "Spells"
-                elif "Artifact" in card_type:
-                    group = "Artifacts"
-                elif "Enchantment" in card_type:
-                    group = "Enchantments"
-                elif "Planeswalker" in card_type:
-                    group = "Planeswalkers"
-                else:
-                    group = "Other"
-                
-                if group not in card_groups:
-                    card_groups[group] = []
-                
-                card_groups[group].append((card_id, quantity))
-            except:
-                pass
+            card = deck_details.get(card_id)
+            if not card:
+                continue
+            group = self.spoiler_group(card.tipo or "")
+            card_groups.setdefault(group, []).append((card_id, quantity, card))
         
         # Ordenar grupos
         ordered_groups = ["Creatures", "Planeswalkers", "Artifacts", "Enchantments", 
                          "Spells", "Lands", "Other"]
-        
-        # Mostrar cada grupo
-        for group in ordered_groups:
-            if group not in card_groups or not card_groups[group]:
-                continue
-                
-            # Frame para el grupo
-            group_frame = ttk.LabelFrame(scrollable_frame, text=f"{group} ({len(card_groups[group])})", 
-                                       padding=10)
-            group_frame.pack(fill=tk.X, padx=5, pady=5)
-            
-            # Frame para las cartas del grupo (con wrap)
-            cards_frame = ttk.Frame(group_frame)
-            cards_frame.pack(fill=tk.X)
-            
-            row_frame = None
-            cards_in_row = 0
-            max_cards_per_row = 8
+        groups = [(group, card_groups[group]) for group in ordered_groups if card_groups.get(group)]
+        cells = [entry for _, entries in groups for entry in entries]
+        
+        # Geometría de cada celda: cantidad, miniatura y nombre
+        pad = 10
+        cell_w = THUMBNAIL_SIZE[0] + 2 * pad
+        cell_h = 20 + THUMBNAIL_SIZE[1] + 45
+        header_h = 34
+        
+        layout = {"rows": [], "tops": [], "width": 0}  # filas: (y, índice de la primera celda, nº de celdas)
+        slots = {}       # índice de celda -> items del canvas que la muestran
+        free_slots = []  # items ocultos listos para reutilizar
+        render_id = None
+        last_scroll = 0.0  # Momento (monotonic) del último desplazamiento del usuario
+        
+        def relayout(width):
+            """Coloca grupos y filas según el ancho disponible"""
+            canvas.delete("header")
+            columns = max(1, (width - pad) // cell_w)
+            rows, y, index = [], pad, 0
+            for group, entries in groups:
+                canvas.create_text(pad, y + header_h // 2, text=f"{group} ({len(entries)})", anchor=tk.W,
+                                   fill=THEME_TEXT, font=("Arial", 11, "bold"), tags="header")
+                canvas.create_line(pad, y + header_h - 4, width - pad, y + header_h - 4,
+                                   fill=THEME_ACCENT, tags="header")
+                y += header_h
+                for start in range(0, len(entries), columns):
+                    rows.append((y, index + start, min(columns, len(entries) - start)))
+                    y += cell_h
+                index += len(entries)
+                y += pad
+            layout["rows"] = rows
+            layout["tops"] = [row[0] for row in rows]
+            layout["width"] = width
+            canvas.configure(scrollregion=(0, 0, width, y))
+            # Las posiciones cambiaron: devolver todas las celdas al pool
+            for index in list(slots):
+                release(index)
+        
+        def cell_position(row, column):
+            return pad + column * cell_w, row[0]
+        
+        def acquire(index, x, y):
+            """Items del canvas para la celda `index` (reutilizados si hay libres)"""
+            if free_slots:
+                slot = free_slots.pop()
+            else:
+                slot = {
+                    "frame": canvas.create_rectangle(0, 0, 0, 0, outline=THEME_ACCENT),
+                    "image": canvas.create_image(0, 0, anchor=tk.NW),
+                    "qty": canvas.create_text(0, 0, anchor=tk.NE, fill="white", font=("Arial", 10, "bold")),
+                    "name": canvas.create_text(0, 0, anchor=tk.N, fill=THEME_TEXT, justify=tk.CENTER,
+                                               width=THUMBNAIL_SIZE[0]),
+                }
+            card_id, quantity, card = cells[index]
+            img_x, img_y = x + pad, y + 20
+            canvas.coords(slot["frame"], img_x, img_y, img_x + THUMBNAIL_SIZE[0], img_y + THUMBNAIL_SIZE[1])
+            canvas.coords(slot["image"], img_x, img_y)
+            canvas.coords(slot["qty"], img_x + THUMBNAIL_SIZE[0], y + 2)
+            canvas.coords(slot["name"], img_x + THUMBNAIL_SIZE[0] // 2, img_y + THUMBNAIL_SIZE[1] + 5)
+            canvas.itemconfigure(slot["qty"], text=f"x{quantity}")
+            canvas.itemconfigure(slot["name"], text=card.nombre or f"ID: {card_id}")
+            canvas.itemconfigure(slot["image"], image='')
+            slot["photo"] = None
+            for item in ("frame", "image", "qty", "name"):
+                canvas.itemconfigure(slot[item], state=tk.NORMAL)
+            slots[index] = slot
+            return slot
+        
+        def release(index):
+            slot = slots.pop(index)
+            self.thumb_loader.cancel(f"{spoiler_win}:{index}")
+            for item in ("frame", "image", "qty", "name"):
+                canvas.itemconfigure(slot[item], state=tk.HIDDEN)
+            slot["photo"] = None
+            free_slots.append(slot)
+        
+        def show_photo(index, photo):
+            slot = slots.get(index)
+            if slot is not None:
+                slot["photo"] = photo  # Mantener referencia aunque salga de la caché
+                canvas.itemconfigure(slot["image"], image=photo)
+        
+        def render():
+            """Crea o reutiliza items solo para las filas visibles (más una de margen)"""
+            nonlocal render_id
+            render_id = None
+            width = canvas.winfo_width()
+            if width <= 1:
+                return
+            if width != layout["width"]:
+                relayout(width)
+            top = canvas.canvasy(0) - cell_h
+            bottom = canvas.canvasy(canvas.winfo_height()) + cell_h
+            rows = layout["rows"]
+            first = max(0, bisect.bisect_right(layout["tops"], top) - 1)
+            visible = {}
+            for row in rows[first:]:
+                if row[0] > bottom:
+                    break
+                for column in range(row[2]):
+                    visible[row[1] + column] = cell_position(row, column)
             
-            for card_id, quantity in card_groups[group]:
-                # Crear nueva fila si es necesario
-                if cards_in_row == 0 or cards_in_row >= max_cards_per_row:
-                    row_frame = ttk.Frame(cards_frame)
-                    row_frame.pack(fill=tk.X, pady=5)
-                    cards_in_row = 0
-                
-                # Frame para cada carta
-                card_frame = ttk.Frame(row_frame)
-                card_frame.pack(side=tk.LEFT, padx=10)
-                
-                # Etiqueta de cantidad
-                qty_label = ttk.Label(card_frame, text=f"x{quantity}", font=("Arial", 10, "bold"),
-                                     foreground="white", background=THEME_DARKER)
-                qty_label.pack(side=tk.TOP, anchor=tk.NE)
-                
-                # Imagen de la carta (miniatura)
-                img_label = ttk.Label(card_frame)
-                img_label.pack(side=tk.TOP)
-                
-                # Nombre de la carta
-                try:
-                    self.cursor.execute("SELECT nombre FROM cartas WHERE id = ?", (card_id,))
-                    card_name = self.cursor.fetchone()[0]
-                    name_label = ttk.Label(card_frame, text=card_name, width=15, wraplength=150)
-                    name_label.pack(side=tk.TOP, pady=(5, 0))
-                except:
-                    name_label = ttk.Label(card_frame, text=f"ID: {card_id}")
-                    name_label.pack(side=tk.TOP, pady=(5, 0))
-                
-                # Cargar imagen en miniatura (en segundo plano para no bloquear la UI)
-                # Obtener el set_name desde la base de datos
-                try:
-                    self.cursor.execute("SELECT set_nombre FROM cartas WHERE id = ?", (card_id,))
-                    result = self.cursor.fetchone()
-                    if result:
-                        set_name = result[0]
-                        # Cargar imagen en miniatura con el set correcto
-                        self.load_card_thumbnail(card_id, set_name, img_label)
-                    else:
-                        logging.warning(f"No se encontró set para la carta {card_id}")
-                except Exception as e:
-                    logging.error(f"Error al obtener set de la carta {card_id}: {e}")
-
-                
-                cards_in_row += 1
+            for index in [i for i in slots if i not in visible]:
+                release(index)
+            # Versión rápida solo mientras el usuario se está desplazando
+            scrolling = time.monotonic() - last_scroll < SCROLL_SETTLE_MS / 1000
+            for order, (index, (x, y)) in enumerate(sorted(visible.items())):
+                if index in slots:
+                    continue
+                slot = acquire(index, x, y)
+                card_id, _, card = cells[index]
+                self.request_thumbnail(card_id, card.set_nombre,
+                                       lambda photo, index=index: show_photo(index, photo),
+                                       priority=order, group=spoiler_win, key=f"{spoiler_win}:{index}",
+                                       quality="fast" if scrolling else "high")
+        
+        def schedule_render(*_):
+            nonlocal render_id
+            if render_id is None:
+                render_id = spoiler_win.after_idle(render)
+        
+        def on_canvas_scroll(first, last):
+            scrollbar.set(first, last)
+            schedule_render()
+        
+        def mark_scrolling():
+            nonlocal last_scroll
+            last_scroll = time.monotonic()
+        
+        def on_scrollbar(*args):
+            mark_scrolling()
+            canvas.yview(*args)
+        
+        def on_mousewheel(event):
+            mark_scrolling()
+            canvas.yview_scroll(int(-event.delta / 120) or (-1 if event.delta > 0 else 1), "units")
+        
+        def on_spoiler_destroy(event):
+            if event.widget is spoiler_win:
+                self.thumb_loader.cancel_group(spoiler_win)
+                if render_id is not None:
+                    spoiler_win.after_cancel(render_id)
+        
+        canvas.configure(yscrollcommand=on_canvas_scroll)
+        canvas.bind("<Configure>", schedule_render)
+        canvas.bind("<MouseWheel>", on_mousewheel)
+        spoiler_win.bind("<Destroy>", on_spoiler_destroy)
         
         # Botón para cerrar
         btn_frame = ttk.Frame(spoiler_win)
@@ -688,97 +2527,105 @@ class WagicCollectionManager:
         # Centrar ventana
         self.center_window(spoiler_win)    
 
-    def load_card_thumbnail(self, card_id, set_name, img_label):
-        """Carga una miniatura de la carta en un label usando las miniaturas preexistentes"""
-        # Crear un hilo para cargar la imagen sin bloquear la UI
-        def load_image_thread():
+    @staticmethod
+    def spoiler_group(card_type):
+        """Grupo del spoiler para una línea de tipo"""
+        if "Creature" in card_type:
+            return "Creatures"
+        if "Land" in card_type:
+            return "Lands"
+        if "Instant" in card_type or "Sorcery" in card_type:
+            return "Spells"
+        if "Artifact" in card_type:
+            return "Artifacts"
+        if "Enchantment" in card_type:
+            return "Enchantments"
+        if "Planeswalker" in card_type:
+            return "Planeswalkers"
+        return "Other"
+
+    def request_thumbnail(self, card_id, set_name, on_ready, priority=0, group=None, key=None,
+                          quality="high"):
+        """Pide la miniatura de una carta; `on_ready(photo)` se llama en el hilo principal.
+
+        La carga se encola en el pool de miniaturas con la clave `key` (para
+        poder cancelarla) y el grupo `group` (la ventana que la muestra, cuyos
+        trabajos se cancelan al cerrarla). Con quality="fast" (mientras se
+        desplaza) y sin la miniatura en la caché en disco, se entrega primero
+        una versión rápida que no entra en la caché en memoria; la de calidad
+        se encola con su propia clave, así que liberar la celda no la cancela.
+        """
+        cache_key = ImageCache.key(set_name, card_id, THUMBNAIL_SIZE)
+        photo = self.image_cache.get(cache_key)
+        if photo is not None:
+            on_ready(photo)
+            return
+        
+        # Cargar la imagen en el pool de hilos sin bloquear la UI
+        def load_image_thread(quality):
             try:
-                # Construir ruta al archivo ZIP
-                zip_path = os.path.join(self.sets_base_path, set_name, f"{set_name}.zip")
+                zip_path = self.resolve_set_archive(set_name, timeout=5)
+                if zip_path is None:
+                    return
                 
-                if not os.path.exists(zip_path):
+                # Atlas del set (mmap); si aún no existe, se intenta empaquetar cuando el
+                # pool quede libre, solo con miniaturas ya en caché (sin decodificar el set)
+                img = self.thumb_atlas.get(zip_path, card_id)
+                if img is not None:
+                    self._decoded_images.put((cache_key, img, on_ready))
                     return
+                if not self.thumb_atlas.is_current(zip_path):
+                    self.thumb_loader.submit(
+                        lambda: self.thumb_atlas.build(self.archive_pool, self.thumb_cache, zip_path, set_name),
+                        ATLAS_BUILD_PRIORITY, group, key=("atlas", zip_path))
                 
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    # Primero buscar en la carpeta de miniaturas
-                    thumbnail_paths = [
-                        f"thumbnails/{card_id}.jpg",
-                        f"thumbnails/{card_id}.JPG",
-                        f"thumbnails/{card_id}.png",
-                        f"thumbnails/{card_id}.PNG",
-                        f"{set_name}/thumbnails/{card_id}.jpg",
-                        f"{set_name}/thumbnails/{card_id}.JPG",
-                        f"{set_name}/thumbnails/{card_id}.png",
-                        f"{set_name}/thumbnails/{card_id}.PNG",
-                    ]
-                    
-                    # Si no se encuentra en thumbnails, buscar en las ubicaciones originales
-                    standard_paths = [
-                        f"{set_name}/{card_id}.jpg",
-                        f"{set_name}/{card_id}.JPG",
-                        f"{set_name}/{card_id}.png",
-                        f"{set_name}/{card_id}.PNG",
-                        f"{set_name.lower()}/{card_id}.jpg",
-                        f"{set_name.lower()}/{card_id}.png",
-                        f"{card_id}.jpg",
-                        f"{card_id}.JPG",
-                        f"{card_id}.png",
-                        f"{card_id}.PNG"
-                    ]
-                    
-                    img_found = None
-                    # Buscar primero en thumbnails
-                    for path in thumbnail_paths:
-                        if path in zip_ref.namelist():
-                            img_found = path
-                            break
-                    
-                    # Si no se encontró en thumbnails, buscar en ubicaciones estándar
-                    if not img_found:
-                        for path in standard_paths:
-                            if path in zip_ref.namelist():
-                                img_found = path
-                                break
-                    
-                    if not img_found:
-                        return
-                    
-                    # Extraer imagen
-                    img_data = zip_ref.read(img_found)
-                    
-                    # Cargar con PIL
-                    img = Image.open(io.BytesIO(img_data))
-                    
-                    # Si la imagen viene de la carpeta thumbnails, usar directamente
-                    # De lo contrario, redimensionar (por si acaso)
-                    if "thumbnails" not in img_found:
-                        # Calcular nuevo tamaño para miniatura
-                        original_width, original_height = img.size
-                        ratio = min(150 / original_width, 210 / original_height)
-                        new_size = (int(original_width * ratio), int(original_height * ratio))
-                        img = img.resize(new_size, Image.LANCZOS)
-                    
-                    photo = ImageTk.PhotoImage(img)
-                    
-                    # Actualizar UI en el hilo principal
-                    self.root.after(0, lambda: self.update_thumbnail(img_label, photo))
+                # Caché en disco o, si no está, ZIP (miniaturas primero y luego ubicaciones estándar)
+                img = load_resized_image(self.archive_pool, self.thumb_cache, zip_path, set_name,
+                                         card_id, THUMBNAIL_SIZE, thumbnail=True, quality=quality)
+                if img is None:
+                    return
+                if quality == "fast" and not self.thumb_cache.contains(zip_path, card_id, THUMBNAIL_SIZE):
+                    # Versión de calidad cuando el pool quede libre (detrás de todo lo visible)
+                    self.thumb_loader.submit(lambda: load_image_thread("high"),
+                                             THUMB_UPGRADE_PRIORITY + priority, group,
+                                             key=("upgrade", key) if key is not None else None)
+                    # La versión rápida no se cachea: la próxima petición vuelve a buscar la buena
+                    self._decoded_images.put((None, img, on_ready))
+                    return
+                
+                # El PhotoImage se crea en el hilo principal (Tk no es seguro entre hilos)
+                self._decoded_images.put((cache_key, img, on_ready))
                     
             except Exception as e:
                 logging.error(f"Error loading thumbnail: {str(e)}")
         
-        # Iniciar hilo
-        threading.Thread(target=load_image_thread, daemon=True).start()
+        self.thumb_loader.submit(lambda: load_image_thread(quality), priority, group, key=key)
+        self.schedule_image_drain()
     
-    def update_thumbnail(self, img_label, photo):
-        """Actualiza el label con la miniatura cargada"""
-        img_label.config(image=photo)
-        img_label.image = photo  # Mantener referencia
+    def schedule_image_drain(self):
+        """Asegura que el hilo principal esté recogiendo imágenes decodificadas"""
+        if self._image_drain_id is None:
+            self._image_drain_id = self.root.after(IMAGE_DRAIN_MS, self.drain_decoded_images)
+    
+    def drain_decoded_images(self):
+        """Convierte a PhotoImage las imágenes decodificadas, sin pasarse del presupuesto del frame"""
+        self._image_drain_id = None
+        deadline = time.perf_counter() + IMAGE_FRAME_BUDGET_MS / 1000
+        while time.perf_counter() < deadline:
+            try:
+                cache_key, img, callback = self._decoded_images.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                photo = ImageTk.PhotoImage(img)
+                # Sin clave: versión provisional que no debe quedarse en la caché
+                callback(self.image_cache.put(cache_key, photo) if cache_key is not None else photo)
+            except tk.TclError as e:
+                logging.debug(f"Imagen descartada: {e}")
+        # Seguir mientras queden imágenes por llegar
+        if not self._decoded_images.empty() or self.thumb_loader.busy():
+            self.schedule_image_drain()
     
-    def update_thumbnail(self, img_label, photo):
-        """Actualiza el label con la miniatura cargada"""
-        img_label.config(image=photo)
-        img_label.image = photo  # Mantener referencia 
-        
     def center_window(self, window):
         """Centra una ventana en la pantalla"""
         window.update_idletasks()
@@ -849,8 +2696,9 @@ class WagicCollectionManager:
         col_widths = [80, 250, 80, 150, 80, 150]  # Nuevo ancho para Type
         for col, width in zip(columns, col_widths):
                 self.deck_tree.heading(col, text=col, 
-                                      command=lambda c=col: self.sort_treeview(self.deck_tree, c, False))
+                                      command=lambda c=col: self.sort_treeview(self.deck_tree, c))
                 self.deck_tree.column(col, width=width, minwidth=50)
+        self.enable_multi_sort(self.deck_tree)
         
         # Scrollbar vertical
         vsb = ttk.Scrollbar(left_frame, orient=tk.VERTICAL, command=self.deck_tree.yview)
@@ -904,17 +2752,91 @@ class WagicCollectionManager:
                                                 command=self.decrement_deck_card_quantity)
         self.remove_from_deck_button.pack(side=tk.LEFT, padx=5, expand=True, fill=tk.X)
 
+    def ensure_indexes(self):
+        """Crea en cards.db los índices que usan las búsquedas por nombre"""
+        try:
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_cartas_nombre_set ON cartas(nombre, set_nombre)")
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"No se pudo crear el índice de nombres: {e}")
+
     def update_status(self, message):
         self.status_var.set(message)
         self.root.update_idletasks()
 
+    def get_card(self, card_id):
+        """Datos de una carta: del catálogo en memoria o, si aún no está cargado, de SQLite"""
+        if self.catalog.ready:
+            return self.catalog.get(card_id)
+        self.cursor.execute(f"SELECT {', '.join(CardRecord.__slots__)} FROM cartas WHERE id = ?", (card_id,))
+        row = self.cursor.fetchone()
+        return CardRecord(str(row[0]), *row[1:]) if row else None
+
+    def get_cards(self, card_ids):
+        """Devuelve {id: CardRecord} para varias cartas con una sola consulta como mucho"""
+        card_ids = list(card_ids)
+        if self.catalog.ready:
+            return self.catalog.get_many(card_ids)
+        found = {}
+        # Por lotes para no superar el límite de parámetros de SQLite
+        for start in range(0, len(card_ids), 900):
+            chunk = card_ids[start:start + 900]
+            placeholders = ','.join('?' for _ in chunk)
+            self.cursor.execute(f"""
+                SELECT {', '.join(CardRecord.__slots__)}
+                FROM cartas
+                WHERE id IN ({placeholders})
+            """, chunk)
+            for row in self.cursor.fetchall():
+                found[str(row[0])] = CardRecord(str(row[0]), *row[1:])
+        return found
+
     def search_cards(self, event=None):
+        """Búsqueda explícita (Enter o botón Buscar)"""
         query = self.search_entry.get().strip()
         if not query:
             messagebox.showinfo("Búsqueda", LANG["msg_search_empty"])
             return
         
-        self.result_tree.delete(*self.result_tree.get_children())
+        self.start_search(query, explicit=True)
+
+    def on_search_key(self, event=None):
+        """Reprograma la búsqueda incremental tras cada pulsación"""
+        if self._search_after_id:
+            self.root.after_cancel(self._search_after_id)
+        self._search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.live_search)
+
+    def live_search(self):
+        """Lanza la búsqueda incremental cuando el usuario deja de escribir"""
+        self._search_after_id = None
+        query = self.search_entry.get().strip()
+        if query == self._last_search_query:
+            return
+        if not query:
+            self._last_search_query = None
+            self._search_after_key = None
+            self._search_loading = False
+            self.search_worker.cancel()
+            if self._search_poll_id:
+                self.root.after_cancel(self._search_poll_id)
+                self._search_poll_id = None
+            self.clear_tree(self.result_tree)
+            self.card_info.config(text=LANG["info_select_card"])
+            return
+        self.start_search(query)
+
+    def start_search(self, query, explicit=False):
+        """Envía la consulta al hilo de búsqueda y limpia los resultados actuales"""
+        if self._search_after_id:
+            self.root.after_cancel(self._search_after_id)
+            self._search_after_id = None
+        self._last_search_query = query
+        self._search_explicit = explicit
+        self._search_after_key = None
+        self._search_total = 0
+        self._search_shown = 0
+        
+        self.clear_tree(self.result_tree)
         self.card_info.config(text="Buscando...")
         self.card_image.config(image='')
         self.card_text.config(state=tk.NORMAL)
@@ -922,44 +2844,89 @@ class WagicCollectionManager:
         self.card_text.config(state=tk.DISABLED)
         self.update_status(f"Buscando: {query}...")
         
-        try:
-            # CAMBIO 2: Modificar consulta para incluir "mana"
-            self.cursor.execute("""
-                SELECT id, nombre, mana, set_nombre, rarity, tipo, subtipo, texto 
-                FROM cartas 
-                WHERE nombre LIKE ? 
-                   OR tipo LIKE ? 
-                   OR subtipo LIKE ?
-                   OR texto LIKE ?
-                ORDER BY nombre
-            """, (f'%{query}%', f'%{query}%', f'%{query}%', f'%{query}%'))
-            
-            results = self.cursor.fetchall()
-            
-            if not results:
-                self.update_status(f"No se encontraron cartas para: {query}")
-                self.card_info.config(text="No se encontraron resultados")
-                return
-            
-            for card in results:
-                # CAMBIO 3: Añadir "mana" en los valores mostrados
-                self.result_tree.insert('', tk.END, values=(
-                    card[0],  # ID
-                    card[1],  # Nombre
-                    card[2],  # Mana
-                    card[3],  # Set
-                    card[4],  # Rareza
-                    card[5],   # Tipo
-                    card[6]   # Texto
-                ))
-            
-            self.update_status(f"Encontradas {len(results)} cartas para: {query}")
-            if self.result_tree.get_children():
-                self.result_tree.selection_set(self.result_tree.get_children()[0])
-                self.result_tree.focus_set()
-            
-        except sqlite3.Error as e:
-            messagebox.showerror("Error de base de datos", str(e))
+        self.request_search_page(None)
+
+    def request_search_page(self, after):
+        """Pide al hilo de búsqueda la primera página o la siguiente a `after`"""
+        if self._last_search_query is None:
+            return  # Caja de búsqueda vacía: no hay consulta que continuar
+        self._search_loading = True
+        self.search_worker.submit(self._last_search_query, after)
+        if not self._search_poll_id:
+            self._search_poll_id = self.root.after(SEARCH_POLL_MS, self.poll_search_results)
+
+    def on_result_scroll(self, first, last):
+        """yscrollcommand de result_tree: carga la página siguiente cerca del final"""
+        self.result_vsb.set(first, last)
+        if (float(last) >= 0.9 and not self._search_loading
+                and self._last_search_query is not None and self._search_after_key is not None):
+            self.request_search_page(self._search_after_key)
+
+    def poll_search_results(self):
+        """Recoge en el hilo principal los resultados del hilo de búsqueda"""
+        self._search_poll_id = None
+        latest = None
+        while True:
+            try:
+                result = self.search_worker.results.get_nowait()
+            except queue.Empty:
+                break
+            # Descartar resultados de consultas ya reemplazadas
+            if result[0] == self.search_worker.generation:
+                latest = result
+        
+        if latest:
+            self.show_search_results(*latest[1:])
+        else:
+            self._search_poll_id = self.root.after(SEARCH_POLL_MS, self.poll_search_results)
+
+    def show_search_results(self, query, results, total, after, error):
+        """Añade a result_tree una página de resultados de la última búsqueda"""
+        self._search_loading = False
+        if error is not None:
+            self._search_after_key = None
+            messagebox.showerror("Error de base de datos", str(error))
+            return
+        
+        first_page = after is None
+        if first_page:
+            self._search_total = total or 0
+            self._search_shown = 0
+        
+        if first_page and not results:
+            self.update_status(f"No se encontraron cartas para: {query}")
+            self.card_info.config(text="No se encontraron resultados")
+            return
+        
+        for card in results:
+            # CAMBIO 3: Añadir "mana" en los valores mostrados
+            self.insert_tree_row(self.result_tree, (
+                card[0],  # ID
+                card[1],  # Nombre
+                card[2],  # Mana
+                card[3],  # Set
+                card[4],  # Rareza
+                card[5],   # Tipo
+                card[6]   # Texto
+            ))
+        # Las páginas llegan en el orden de la consulta: recolocarlas si el usuario ordenó la lista
+        if not first_page:
+            self.resort_tree(self.result_tree)
+        
+        # Clave para pedir la página siguiente (None si ya no quedan filas)
+        if len(results) == SEARCH_PAGE_SIZE:
+            self._search_after_key = (results[-1][1] or '', results[-1][-1])
+        else:
+            self._search_after_key = None
+        
+        self._search_shown += len(results)
+        self.update_status(f"Encontradas {self._search_total} cartas para: {query} "
+                           f"(mostrando {self._search_shown})")
+        # Solo en búsquedas explícitas: seleccionar carga la imagen de la carta, y
+        # hacerlo tras cada pulsación de la búsqueda incremental frenaría la escritura
+        if first_page and self._search_explicit and self.result_tree.get_children():
+            self.result_tree.selection_set(self.result_tree.get_children()[0])
+            self.result_tree.focus_set()
 
     def on_card_select(self, event):
         selected_items = self.result_tree.selection()
@@ -975,32 +2942,28 @@ class WagicCollectionManager:
         # Obtener todos los valores de la carta
         card_id = all_values[0]
         try:
-            # CAMBIO 4: Modificar consulta para incluir "mana"
-            self.cursor.execute("""
-                SELECT id, nombre, mana, set_nombre, rarity, texto, tipo, subtipo 
-                FROM cartas 
-                WHERE id = ?
-            """, (card_id,))
-            card = self.cursor.fetchone()
+            # CAMBIO 4: Datos desde el catálogo en memoria
+            card = self.get_card(card_id)
             
             if card:
                 # CAMBIO 5: Añadir "mana" en la información mostrada
-                info_text = f"ID: {card[0]}\nName: {card[1]}\nMana: {card[2]}\nSet: {card[3]}\nRarity: {card[4]}"
-                if card[6]:  # Tipo
-                    info_text += f"\nType: {card[6]}"
-                if card[7]:  # Subtipo
-                    info_text += f"\nSubtype: {card[7]}"
+                info_text = f"ID: {card.id}\nName: {card.nombre}\nMana: {card.mana}\nSet: {card.set_nombre}\nRarity: {card.rarity}"
+                if card.tipo:
+                    info_text += f"\nType: {card.tipo}"
+                if card.subtipo:
+                    info_text += f"\nSubtype: {card.subtipo}"
                 
                 self.card_info.config(text=info_text)
                 
                 # Mostrar texto de la carta
                 self.card_text.config(state=tk.NORMAL)
                 self.card_text.delete(1.0, tk.END)
-                self.card_text.insert(tk.END, card[5] or "Sin texto")  # Texto de la carta
+                self.card_text.insert(tk.END, card.texto or "Sin texto")  # Texto de la carta
                 self.card_text.config(state=tk.DISABLED)
                 
-                # Mostrar imagen
-                self.show_card_image(card_id, card[3], self.card_image)
+                # Mostrar imagen y adelantar las de las filas vecinas
+                self.show_card_image(card_id, card.set_nombre, self.card_image)
+                self.prefetch_neighbor_images(self.result_tree, item)
         
         except sqlite3.Error as e:
             logging.error(f"Error al obtener detalles de la carta: {str(e)}")
@@ -1019,8 +2982,9 @@ class WagicCollectionManager:
         card_id, name, set_name, quantity = values
         self.card_info_collection.config(text=f"ID: {card_id}\nNombre: {name}\nSet: {set_name}\nCantidad: {quantity}")
         
-        # Mostrar imagen
+        # Mostrar imagen y adelantar las de las filas vecinas
         self.show_card_image(card_id, set_name, self.card_image_collection)
+        self.prefetch_neighbor_images(self.collection_tree, selected_items[0])
     
     def on_deck_card_select(self, event):
         """Manejador de selección de cartas en el deck con nueva columna Type"""
@@ -1036,133 +3000,109 @@ class WagicCollectionManager:
         card_id, name, mana, set_name, quantity, card_type = values
         self.deck_card_info.config(text=f"ID: {card_id}\nName: {name}\nMana: {mana}\nSet: {set_name}\nType: {card_type}\nQuantity: {quantity}")
         
-        # Mostrar imagen
+        # Mostrar imagen y adelantar las de las filas vecinas
         self.show_card_image(card_id, set_name, self.deck_card_image)
+        self.prefetch_neighbor_images(self.deck_tree, selected_items[0])
+
+    def resolve_set_archive(self, set_name, timeout=0):
+        """Ruta del ZIP de un set, o None (ver SetArchiveIndex.lookup)"""
+        return self.set_archives.lookup(set_name, timeout)
+
+    def prefetch_neighbor_images(self, tree, item):
+        """Carga en segundo plano las imágenes de detalle de las filas cercanas a `item`.
+
+        La ventana se inclina hacia la dirección en la que avanza la selección,
+        y cada nueva selección descarta lo pendiente de la anterior.
+        """
+        children = tree.get_children()
+        if len(children) < 2:
+            return
+        index = tree.index(item)
+        last = self._prefetch_last.get(tree)
+        self._prefetch_last[tree] = index
+        if last is None or abs(index - last) > 1:
+            offsets = [1, -1, 2, -2]  # Salto o primera selección: ambos lados
+        else:
+            step = 1 if index >= last else -1
+            offsets = [step * i for i in range(1, PREFETCH_AHEAD + 1)]
+            offsets += [-step * i for i in range(1, PREFETCH_BEHIND + 1)]
+        
+        self.thumb_loader.cancel_group(tree)
+        for priority, offset in enumerate(offsets):
+            neighbor = index + offset
+            if not 0 <= neighbor < len(children):
+                continue
+            card_id = tree.set(children[neighbor], "ID")
+            set_name = tree.set(children[neighbor], "Set")
+            cache_key = ImageCache.key(set_name, card_id, DETAIL_SIZE)
+            if not card_id or self.image_cache.get(cache_key) is not None:
+                continue
+            
+            def prefetch(card_id=card_id, set_name=set_name, cache_key=cache_key):
+                zip_path = self.resolve_set_archive(set_name, timeout=5)
+                if zip_path is None:
+                    return
+                img = load_resized_image(self.archive_pool, self.thumb_cache, zip_path, set_name,
+                                         card_id, DETAIL_SIZE)
+                if img is not None:
+                    # Solo calentar la caché: el PhotoImage se crea en el hilo principal
+                    self._decoded_images.put((cache_key, img, lambda photo: None))
+            
+            self.thumb_loader.submit(prefetch, priority, tree, key=("detail",) + cache_key)
+        self.schedule_image_drain()
 
     def show_card_image(self, card_id, set_name, image_label):
+        self._shown_image[image_label] = (card_id, set_name)
+        # Reutilizar la imagen si ya se decodificó para cualquier panel
+        cache_key = ImageCache.key(set_name, card_id, DETAIL_SIZE)
+        photo = self.image_cache.get(cache_key)
+        if photo is not None:
+            image_label.config(image=photo)
+            image_label.image = photo
+            self.update_status(f"Imagen cargada: {set_name}/{card_id}")
+            return
+        
         # Limpiar imagen actual
         image_label.config(image='')
         image_label.image = None  # Eliminar referencia anterior
         
-        # Crear carpeta temp si no existe, dentro del directorio de la aplicación
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        temp_dir = os.path.join(base_dir, "temp")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # Construir ruta al archivo ZIP
-        zip_path = os.path.join(self.sets_base_path, set_name, f"{set_name}.zip")
-        logging.info(f"Intentando cargar imagen desde: {zip_path}")
-        
-        if not os.path.exists(zip_path):
-            # Intentar diferentes variaciones de nombre
-            possible_zip_names = [
-                f"{set_name}.zip",
-                f"{set_name.lower()}.zip",
-                f"{set_name.upper()}.zip",
-                f"{set_name.replace(' ', '_')}.zip",
-                f"{set_name.replace(':', '')}.zip"
-            ]
-            
-            for zip_name in possible_zip_names:
-                test_path = os.path.join(self.sets_base_path, set_name, zip_name)
-                if os.path.exists(test_path):
-                    zip_path = test_path
-                    logging.info(f"Archivo ZIP encontrado: {zip_path}")
-                    break
-            else:
-                self.update_status(f"Archivo ZIP no encontrado para el set: {set_name}")
-                logging.error(f"No se encontró archivo ZIP para el set: {set_name}")
-                return
+        if not self.set_archives.is_ready():
+            # El índice de sets aún se está construyendo: reintentar sin bloquear la UI
+            self.update_status(f"Buscando los sets... ({set_name}/{card_id})")
+            self.root.after(200, self.retry_card_image, card_id, set_name, image_label)
+            return
+        zip_path = self.resolve_set_archive(set_name)
+        if zip_path is None:
+            self.update_status(f"Archivo ZIP no encontrado para el set: {set_name}")
+            logging.error(f"No se encontró archivo ZIP para el set: {set_name}")
+            return
         
         try:
-            # Abrir el archivo ZIP
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                # Generar posibles rutas de imagen
-                possible_paths = [
-                    f"{set_name}/{card_id}.jpg",
-                    f"{set_name}/{card_id}.JPG",
-                    f"{set_name}/{card_id}.png",
-                    f"{set_name}/{card_id}.PNG",
-                    f"{set_name.lower()}/{card_id}.jpg",
-                    f"{set_name.lower()}/{card_id}.png",
-                    f"{card_id}.jpg",  # Algunos sets no tienen subcarpeta
-                    f"{card_id}.JPG",
-                    f"{card_id}.png",
-                    f"{card_id}.PNG"
-                ]
-                
-                img_found = None
-                for path in possible_paths:
-                    if path in zip_ref.namelist():
-                        img_found = path
-                        logging.info(f"Imagen encontrada en ZIP: {path}")
-                        break
-                
-                if not img_found:
-                    self.update_status(f"Imagen no encontrada en ZIP para ID: {card_id}")
-                    logging.warning(f"Imagen no encontrada en ZIP. Rutas intentadas: {possible_paths}")
-                    return
-                
-                # Crear un nombre de archivo temporal único en la carpeta temp
-                temp_filename = f"{set_name}_{card_id}.jpg"
-                temp_path = os.path.join(temp_dir, temp_filename)
-                
-                img_data = zip_ref.read(img_found)
-                
-                # Verificar si es PNG y convertir a JPG si es necesario
-                if img_found.lower().endswith('.png'):
-                    png_image = Image.open(io.BytesIO(img_data))
-                    if png_image.mode == 'RGBA':
-                        png_image = png_image.convert('RGB')
-                    # Guardar como JPG en la ruta temporal
-                    png_image.save(temp_path, format='JPEG')
-                    logging.info("Imagen PNG convertida a JPG")
-                else:
-                    # Guardar directamente
-                    with open(temp_path, 'wb') as f:
-                        f.write(img_data)
-                
-                # Cargar imagen con PIL
-                img = Image.open(temp_path)
-                
-                # Calcular nuevo tamaño manteniendo relación de aspecto
-                original_width, original_height = img.size
-                ratio = min(350 / original_width, 490 / original_height)
-                new_size = (int(original_width * ratio), int(original_height * ratio))
-                
-                # Redimensionar con alta calidad
-                img = img.resize(new_size, Image.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
-                
-                # Actualizar widget de imagen
-                image_label.config(image=photo)
-                image_label.image = photo  # Mantener referencia
-                
-                self.update_status(f"Imagen cargada: {set_name}/{card_id}")
-                logging.info(f"Imagen temporal guardada en: {temp_path}")
-                
+            # Caché en disco o, si no está, decodificar desde el miembro del ZIP
+            img = load_resized_image(self.archive_pool, self.thumb_cache, zip_path, set_name,
+                                     card_id, DETAIL_SIZE)
+            if img is None:
+                self.update_status(f"Imagen no encontrada en ZIP para ID: {card_id}")
+                logging.warning(f"Imagen no encontrada en ZIP. Rutas intentadas: {image_candidates(set_name, card_id)}")
+                return
+            
+            photo = self.image_cache.put(cache_key, ImageTk.PhotoImage(img))
+            
+            # Actualizar widget de imagen
+            image_label.config(image=photo)
+            image_label.image = photo  # Mantener referencia
+            
+            self.update_status(f"Imagen cargada: {set_name}/{card_id}")
+            
         except Exception as e:
             self.update_status(f"Error al cargar imagen: {str(e)}")
             logging.exception("Error al cargar imagen")
         
-    def clean_temp_folder(self):
-        """Limpia la carpeta de archivos temporales al iniciar la aplicación"""
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        temp_dir = os.path.join(base_dir, "temp")
-        if os.path.exists(temp_dir):
-            logging.info(f"Limpiando carpeta temporal: {temp_dir}")
-            for filename in os.listdir(temp_dir):
-                file_path = os.path.join(temp_dir, filename)
-                try:
-                    if os.path.isfile(file_path):
-                        os.unlink(file_path)
-                        logging.debug(f"Archivo temporal eliminado: {file_path}")
-                except Exception as e:
-                    logging.error(f"No se pudo eliminar {file_path}: {str(e)}")
-        else:
-            os.makedirs(temp_dir, exist_ok=True)
-            logging.info(f"Carpeta temporal creada: {temp_dir}")
-        
+    def retry_card_image(self, card_id, set_name, image_label):
+        """Vuelve a pedir una imagen si el panel sigue esperando esa misma carta"""
+        if self._shown_image.get(image_label) == (card_id, set_name):
+            self.show_card_image(card_id, set_name, image_label)
+
     def safe_delete(self, path):
         """Eliminar archivo de manera segura"""
         try:
@@ -1174,15 +3114,38 @@ class WagicCollectionManager:
 
     def load_collection(self):
         try:
-            # Cambiamos a un diccionario para almacenar cantidades
+            # Escribir antes lo pendiente: si no, se leería un estado anterior y
+            # el guardado diferido acabaría escribiendo ese estado revertido
+            self.saver.flush()
+            
+            # Diccionario id -> cantidad, de la copia de trabajo compacta
             self.collection = {}
-            if os.path.exists(self.collection_path):
-                with open(self.collection_path, 'r') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line and line.isdigit():
-                            card_id = line
-                            self.collection[card_id] = self.collection.get(card_id, 0) + 1
+            counts_exists = os.path.exists(self.collection_counts_path)
+            if counts_exists:
+                self.collection = read_collection_file(self.collection_counts_path)
+                logging.info(f"Colección leída de {self.collection_counts_path}")
+            
+            # collection.dat solo cuenta si existe, no está vacío y Wagic lo cambió después
+            wagic_path = self.collection_path
+            if (os.path.exists(wagic_path) and os.path.getsize(wagic_path) > 0
+                    and (not counts_exists
+                         or os.path.getmtime(wagic_path) > os.path.getmtime(self.collection_counts_path))):
+                wagic_collection = read_collection_file(wagic_path)
+                if not self.collection:
+                    self.collection = wagic_collection
+                    logging.info(f"Colección leída de {wagic_path}")
+                    self.schedule_collection_save()
+                elif wagic_collection != self.collection:
+                    if messagebox.askyesno(
+                            "Colección modificada por Wagic",
+                            "Wagic ha modificado collection.dat después del último guardado de la colección.\n\n"
+                            "¿Cargar la colección de Wagic? Se perderán los cambios hechos aquí que no se "
+                            "hayan exportado.\n\nNo: se conserva la copia de trabajo y collection.dat se "
+                            "sobrescribirá en la próxima exportación."):
+                        self.collection = wagic_collection
+                        logging.info(f"Colección leída de {wagic_path}")
+                    # En ambos casos la copia de trabajo queda más reciente y no se vuelve a preguntar
+                    self.schedule_collection_save()
             
             self.update_collection_display()
             self.update_collection_total()  # Actualizar el contador total
@@ -1192,46 +3155,145 @@ class WagicCollectionManager:
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo cargar la colección: {str(e)}")
 
-    def update_collection_display(self):
-        """Actualiza la visualización de la colección en el Treeview"""
-        # Limpiar treeview existente
-        self.collection_tree.delete(*self.collection_tree.get_children())
-        
-        if not self.collection:
+    def tree_populator(self, tree):
+        """Rellenador por bloques asociado a un Treeview (uno por árbol).
+
+        El id de cada item es el id de la carta, así que el propio árbol sirve
+        de mapa carta -> fila para las actualizaciones incrementales.
+        """
+        populator = self._populators.get(tree)
+        if populator is None:
+            populator = TreePopulator(
+                tree, lambda done, total: self.update_status(f"Cargando lista: {done}/{total} cartas"),
+                iid_column=0, model=self.tree_model(tree))
+            self._populators[tree] = populator
+        return populator
+
+    @staticmethod
+    def collection_row(card_id, count, card):
+        """Valores de una fila de la colección"""
+        if card:
+            return (card_id, card.nombre, card.set_nombre, count)
+        # Si no se encuentra, mostrar como desconocida
+        return (card_id, "Carta no encontrada", "Set desconocido", count)
+
+    @staticmethod
+    def deck_row(card_id, count, card):
+        """Valores de una fila del deck"""
+        if card:
+            return (card_id, card.nombre, card.mana, card.set_nombre, count, card.tipo)
+        return (card_id, "Card not found", "", "Unknown set", count, "")
+
+    def tree_model(self, tree):
+        """Modelo de filas en Python de un Treeview (uno por árbol)"""
+        model = self._tree_models.get(tree)
+        if model is None:
+            model = self._tree_models[tree] = TreeRowModel()
+        return model
+
+    def clear_tree(self, tree):
+        """Vacía un Treeview y su modelo; el orden elegido deja de aplicarse"""
+        tree.delete(*tree.get_children())
+        self.tree_model(tree).clear()
+        if self._tree_sort.pop(tree, None):
+            self.update_sort_headings(tree)
+
+    def insert_tree_row(self, tree, values):
+        """Inserta una fila al final del árbol registrándola en su modelo"""
+        iid = tree.insert('', tk.END, values=values)
+        self.tree_model(tree).set(iid, values)
+        return iid
+
+    def populate_tree(self, tree, rows):
+        """Rellena un árbol por bloques, respetando el orden que haya elegido el usuario"""
+        order = self._tree_sort.get(tree)
+        if order:
+            columns = list(tree["columns"])
+            for column, reverse in reversed(order):
+                index, key = columns.index(column), tree_sort_key(column)
+                rows.sort(key=lambda values: key(values[index]), reverse=reverse)
+        self.tree_populator(tree).populate(rows)
+
+    def apply_tree_changes(self, tree, changes, rebuild):
+        """Aplica solo las filas cambiadas: {card_id: valores, o None para quitarla}.
+
+        Selección y desplazamiento se conservan porque el resto de filas no se
+        toca. Si el árbol aún se está rellenando por bloques se reconstruye.
+        """
+        populator = self._populators.get(tree)
+        if populator is not None and populator.busy:
+            rebuild()
             return
-        
+        model = self.tree_model(tree)
+        for card_id, values in changes.items():
+            iid = str(card_id)
+            if values is None:
+                if tree.exists(iid):
+                    tree.delete(iid)
+                model.remove(iid)
+                continue
+            if tree.exists(iid):
+                tree.item(iid, values=values)
+            else:
+                tree.insert('', tk.END, iid=iid, values=values)
+            model.set(iid, values)
+        # Las filas nuevas van al final y las cambiadas pueden moverse en el orden elegido
+        if any(values is not None for values in changes.values()):
+            self.resort_tree(tree)
+
+    def resort_tree(self, tree):
+        """Vuelve a aplicar el orden elegido por el usuario, si lo hay, desde el modelo.
+
+        set_children reordena todas las filas del árbol en una sola llamada;
+        las claves de orden ya están en caché salvo las de filas cambiadas.
+        """
+        order = self._tree_sort.get(tree)
+        if order:
+            tree.set_children('', *self.tree_model(tree).sorted_iids(order, list(tree["columns"])))
+
+    def refresh_collection_rows(self, card_ids):
+        """Actualiza en la lista de la colección solo las cartas indicadas"""
+        card_ids = set(card_ids)
+        try:
+            cards = self.get_cards(card_id for card_id in card_ids if card_id in self.collection)
+        except sqlite3.Error as e:
+            logging.error(f"Error al cargar detalles de colección: {str(e)}")
+            cards = {}
+        changes = {card_id: self.collection_row(card_id, self.collection[card_id], cards.get(card_id))
+                   if card_id in self.collection else None
+                   for card_id in card_ids}
+        self.apply_tree_changes(self.collection_tree, changes, self.update_collection_display)
+        self.update_collection_total()
+
+    def refresh_deck_rows(self, card_ids):
+        """Actualiza en la lista del deck solo las cartas indicadas"""
+        card_ids = set(card_ids)
+        try:
+            cards = self.get_cards(card_id for card_id in card_ids if card_id in self.deck_cards)
+        except sqlite3.Error as e:
+            logging.error(f"Error loading deck details: {str(e)}")
+            cards = {}
+        changes = {card_id: self.deck_row(card_id, self.deck_cards[card_id], cards.get(card_id))
+                   if card_id in self.deck_cards else None
+                   for card_id in card_ids}
+        self.apply_tree_changes(self.deck_tree, changes, self.update_deck_display)
+        self.update_deck_total()
+
+    def update_collection_display(self):
+        """Actualiza la visualización de la colección en el Treeview (por bloques)"""
+        rows = []
         try:
             # Obtener detalles de las cartas en la colección
-            card_ids = list(self.collection.keys())
-            placeholders = ','.join('?' for _ in card_ids)
-            
-            self.cursor.execute(f"""
-                SELECT id, nombre, set_nombre 
-                FROM cartas 
-                WHERE id IN ({placeholders})
-            """, card_ids)
-            
-            card_details = {row[0]: (row[1], row[2]) for row in self.cursor.fetchall()}
+            card_details = self.get_cards(self.collection.keys())
             
-            # Insertar en el treeview
-            for card_id, count in self.collection.items():
-                if card_id in card_details:
-                    name, set_name = card_details[card_id]
-                    self.collection_tree.insert('', tk.END, values=(card_id, name, set_name, count))
-                else:
-                    # Si no encontramos detalles, intentar obtenerlos de nuevo
-                    self.cursor.execute("SELECT nombre, set_nombre FROM cartas WHERE id = ?", (card_id,))
-                    result = self.cursor.fetchone()
-                    if result:
-                        name, set_name = result
-                        self.collection_tree.insert('', tk.END, values=(card_id, name, set_name, count))
-                    else:
-                        # Si aún no se encuentra, mostrar como desconocida
-                        self.collection_tree.insert('', tk.END, values=(card_id, "Carta no encontrada", "Set desconocido", count))
+            rows = [self.collection_row(card_id, count, card_details.get(card_id))
+                    for card_id, count in self.collection.items()]
         
         except sqlite3.Error as e:
             logging.error(f"Error al cargar detalles de colección: {str(e)}")
         
+        self.populate_tree(self.collection_tree, rows)
+        
         # Actualizar el contador total
         self.update_collection_total()
 
@@ -1252,28 +3314,27 @@ class WagicCollectionManager:
             return
         
         added_count = 0
+        added_ids = []
         for item in selected_items:
             values = self.result_tree.item(item, 'values')
             if values:
                 card_id = values[0]
                 self.add_to_collection(card_id, quantity)
+                added_ids.append(card_id)
                 added_count += quantity
         
         if added_count > 0:
-            self.update_collection_display()
-            self.save_collection()
+            self.refresh_collection_rows(added_ids)
+            self.schedule_collection_save()
             self.update_collection_total()  # Actualizar el contador total
             self.update_status(f"{added_count} cartas agregadas a la colección")
         else:
             self.update_status("No se agregaron nuevas cartas")
 
     def save_collection(self):
+        """Guarda ya la copia de trabajo compacta (una línea por carta distinta) con una sola escritura"""
         try:
-            with open(self.collection_path, 'w') as f:
-                for card_id, count in self.collection.items():
-                    # Escribir el ID tantas veces como copias haya
-                    for _ in range(count):
-                        f.write(f"{card_id}\n")
+            self.saver.write(self.collection_counts_path, format_collection_counts(self.collection))
             
             total_cards = sum(self.collection.values())
             self.update_status(f"Colección guardada: {len(self.collection)} cartas únicas, {total_cards} copias")
@@ -1281,18 +3342,45 @@ class WagicCollectionManager:
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo guardar la colección: {str(e)}")
 
+    def schedule_collection_save(self):
+        """Guarda la colección en segundo plano cuando cesen los cambios"""
+        self.saver.schedule(self.collection_counts_path, lambda: format_collection_counts(self.collection))
+
+    def schedule_deck_save(self):
+        """Guarda el deck actual en segundo plano cuando cesen los cambios"""
+        deck_path = getattr(self, 'current_deck_path', None)
+        deck_name = self.deck_name_var.get().strip()
+        if not deck_path or not deck_name:
+            return
+        # Copia del contenido actual: si se cambia de deck antes de guardar, no se mezcla
+        cards = list(self.deck_cards.items())
+        self.saver.schedule(deck_path, lambda: format_deck_file(deck_name, cards))
+
+    def export_collection_for_wagic(self):
+        """Escribe collection.dat en el formato de Wagic (el ID tantas veces como copias haya)"""
+        try:
+            self.saver.write(self.collection_path, format_collection_expanded(self.collection))
+            
+            total_cards = sum(self.collection.values())
+            self.update_status(f"Colección exportada para Wagic: {total_cards} copias en {self.collection_path}")
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudo exportar la colección: {str(e)}")
+
     def clear_collection(self):
         if messagebox.askyesno("Confirmar", LANG["msg_confirm_clear"]):
             self.collection = {}
-            self.save_collection()
+            self.schedule_collection_save()
             self.update_collection_display()
             self.update_collection_total()  # Actualizar el contador total
             self.update_status(LANG["msg_collection_cleared"])
 
     def open_collection_file(self):
+        """Abre la copia de trabajo de la colección con los cambios ya guardados"""
         try:
-            os.startfile(self.collection_path)
-            self.update_status(f"Archivo de colección abierto: {self.collection_path}")
+            self.saver.write(self.collection_counts_path, format_collection_counts(self.collection))
+            os.startfile(self.collection_counts_path)
+            self.update_status(f"Archivo de colección abierto: {self.collection_counts_path}")
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo abrir el archivo: {str(e)}")
 
@@ -1322,72 +3410,24 @@ class WagicCollectionManager:
             with open(file_path, 'r', encoding='utf-8') as f:
                 deck_lines = f.readlines()
             
-            deck_name = "Deck Importado"
-            cards = []  # Lista de tuplas (card_id, quantity)
+            deck_name, entries = self.parse_deck_lines(deck_lines, "Deck Importado")
+            cards, missing, corrected = self.resolve_deck_entries(entries)
             total_copies = 0
             
-            # Expresión regular para analizar las líneas del deck
-            card_pattern = re.compile(r'(.+?)\s*(?:\(([^)]+)\))?\s*\*?(\d+)?$')
-            
-            for line in deck_lines:
-                line = line.strip()
-                if not line:
-                    continue
-                    
-                # Extraer nombre del deck
-                if line.startswith('#NAME:'):
-                    deck_name = line.split(':', 1)[1].strip()
-                    continue
-                    
-                # Buscar cartas con el patrón
-                match = card_pattern.match(line)
-                if not match:
-                    # Intentar formato de ID directo (ej: "123456 4")
-                    if line.replace(' ', '').isdigit() or ' ' in line:
-                        parts = line.split()
-                        if len(parts) == 1 and parts[0].isdigit():
-                            card_id = parts[0]
-                            cards.append((card_id, 1))
-                            self.add_to_collection(card_id, 1)
-                            total_copies += 1
-                        elif len(parts) >= 2 and parts[0].isdigit() and parts[1].isdigit():
-                            card_id = parts[0]
-                            quantity = int(parts[1])
-                            cards.append((card_id, quantity))
-                            self.add_to_collection(card_id, quantity)
-                            total_copies += quantity
-                    continue
-                    
-                card_name = match.group(1).strip()
-                set_name = match.group(2).strip() if match.group(2) else None
-                quantity = int(match.group(3)) if match.group(3) else 1
-                
-                # Buscar la carta en la base de datos
-                query = "SELECT id FROM cartas WHERE nombre = ?"
-                params = [card_name]
-                
-                if set_name:
-                    query += " AND set_nombre = ?"
-                    params.append(set_name)
-                    
-                self.cursor.execute(query + " LIMIT 1", params)
-                result = self.cursor.fetchone()
-                
-                if result:
-                    card_id = result[0]
-                    cards.append((card_id, quantity))
-                    # Agregar a la colección
-                    self.add_to_collection(card_id, quantity)
-                    total_copies += quantity
-                else:
-                    logging.warning(f"Carta no encontrada: {card_name} ({set_name})")
+            for card_id, quantity in cards:
+                # Agregar a la colección
+                self.add_to_collection(card_id, quantity)
+                total_copies += quantity
+            for card_name, set_name, suggestion in missing:
+                hint = f" - ¿Quizás '{suggestion}'?" if suggestion else ""
+                logging.warning(f"Carta no encontrada: {card_name} ({set_name}){hint}")
             
             if not cards:
                 messagebox.showwarning("Deck vacío", LANG["msg_deck_empty"])
                 return
             
             # Guardar la colección actualizada
-            self.save_collection()
+            self.schedule_collection_save()
             self.update_collection_display()
             self.update_collection_total()  # Actualizar el contador total
                 
@@ -1395,19 +3435,15 @@ class WagicCollectionManager:
             deck_number = self.get_next_deck_number()
             deck_filename = os.path.join(self.decks_path, f"deck{deck_number}.txt")
             
-            with open(deck_filename, 'w', encoding='utf-8') as f:
-                f.write(f"#NAME:{deck_name}\n")
-                for card_id, quantity in cards:
-                    # Escribir el ID la cantidad de veces especificada
-                    for _ in range(quantity):
-                        f.write(f"{card_id}\n")
+            self.saver.write(deck_filename, format_deck_file(deck_name, cards))
             
             messagebox.showinfo("Deck importado", 
                 f"Deck importado con éxito!\n"
                 f"Nombre: {deck_name}\n"
                 f"Cartas únicas: {len(cards)}\n"
                 f"Copias totales: {total_copies}\n"
-                f"Guardado como: {deck_filename}")
+                f"Guardado como: {deck_filename}"
+                f"{self.format_missing_cards(missing, corrected)}")
                 
             self.update_status(f"Deck importado: {deck_name} ({len(cards)} cartas únicas, {total_copies} copias)")
             
@@ -1415,6 +3451,163 @@ class WagicCollectionManager:
             logging.exception("Error al importar deck")
             messagebox.showerror("Error", f"No se pudo importar el deck:\n{str(e)}")
 
+    def parse_deck_lines(self, deck_lines, default_name):
+        """Analiza un fichero de deck.
+
+        Devuelve (nombre_del_deck, entradas), donde cada entrada es
+        ("id", card_id, None, cantidad) o ("name", nombre, set, cantidad).
+        """
+        deck_name = default_name
+        entries = []
+        
+        # Expresión regular para analizar las líneas del deck: "Nombre (Set) *4" o "Nombre x4"
+        card_pattern = re.compile(r'(.+?)\s*(?:\(([^)]+)\))?\s*(?:\*|[xX](?=\d))?(\d+)?$')
+        # Cantidad delante del nombre, como se escribe a mano: "4 Goblin Guide", "4x Lightning Bolt"
+        count_prefix = re.compile(r'(\d{1,2})\s*[xX]?\s+(?=\D)')
+        
+        for line in deck_lines:
+            line = line.strip()
+            if not line:
+                continue
+                
+            # Extraer nombre del deck
+            if line.startswith('#NAME:'):
+                deck_name = line.split(':', 1)[1].strip()
+                continue
+            
+            # Formato de ID directo (ej: "123456" o "123456 4")
+            parts = line.split()
+            if len(parts) == 1 and parts[0].isdigit():
+                entries.append(("id", parts[0], None, 1))
+                continue
+            if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
+                entries.append(("id", parts[0], None, int(parts[1])))
+                continue
+            
+            quantity = None
+            prefix = count_prefix.match(line)
+            if prefix:
+                quantity = int(prefix.group(1))
+                line = line[prefix.end():]
+                
+            # Buscar cartas con el patrón
+            match = card_pattern.match(line)
+            if not match:
+                continue
+                
+            card_name = match.group(1).strip()
+            set_name = match.group(2).strip() if match.group(2) else None
+            if match.group(3):
+                quantity = int(match.group(3))
+            entries.append(("name", card_name, set_name, quantity or 1))
+        
+        return deck_name, entries
+
+    def resolve_deck_entries(self, entries):
+        """Resuelve los nombres de un deck a ids en una sola pasada.
+
+        Los pares (nombre, set) distintos se cargan en una tabla temporal y se
+        cruzan con `cartas` usando el índice (nombre, set_nombre); los que no
+        aparecen se corrigen con CardNameMatcher si el parecido es alto.
+        Devuelve (cartas, no_encontradas, corregidas) con cartas como lista de
+        (card_id, cantidad) en el orden del fichero, no_encontradas como
+        (nombre, set, sugerencia) y corregidas como (nombre, set, nombre_usado).
+        """
+        names = {(name, set_name) for kind, name, set_name, _ in entries if kind == "name"}
+        resolved = self.lookup_name_pairs(names)
+        
+        # Nombres no encontrados: corregir con el índice de trigramas
+        unresolved = {pair for pair in names if pair not in resolved}
+        suggestions, applied = {}, {}
+        if unresolved:
+            matcher = self.get_name_matcher()
+            corrected = {}
+            for name, set_name in unresolved:
+                canonical, score = matcher.match(name)
+                if canonical and score >= matcher.AUTO_SCORE:
+                    corrected[(name, set_name)] = canonical
+                elif canonical and score >= matcher.SUGGEST_SCORE:
+                    suggestions[(name, set_name)] = canonical
+            if corrected:
+                # Primero con el set indicado y, si no existe en ese set, en cualquiera
+                retry = {(canonical, set_name) for (_, set_name), canonical in corrected.items()}
+                retry |= {(canonical, None) for canonical in corrected.values()}
+                found = self.lookup_name_pairs(retry)
+                for (name, set_name), canonical in corrected.items():
+                    card_id = found.get((canonical, set_name)) or found.get((canonical, None))
+                    if card_id:
+                        resolved[(name, set_name)] = card_id
+                        applied[(name, set_name)] = canonical
+                        logging.info(f"Nombre corregido: '{name}' -> '{canonical}'")
+        
+        cards, missing = [], []
+        for kind, value, set_name, quantity in entries:
+            if kind == "id":
+                cards.append((value, quantity))
+            elif (value, set_name) in resolved:
+                cards.append((resolved[(value, set_name)], quantity))
+            else:
+                missing.append((value, set_name, suggestions.get((value, set_name))))
+        corrected = [(name, set_name, canonical) for (name, set_name), canonical in applied.items()]
+        return cards, missing, corrected
+
+    def format_missing_cards(self, missing, corrected=(), limit=10):
+        """Texto para avisar de las cartas corregidas automáticamente y de las no encontradas"""
+        lines = []
+        for title, items, hint in ((f"Corregidas ({len(corrected)})", corrected, "-> {}"),
+                                   (f"No encontradas ({len(missing)})", missing, "-> ¿{}?")):
+            if not items:
+                continue
+            lines.append(f"\n\n{title}:")
+            for card_name, set_name, other in items[:limit]:
+                line = f"  {card_name}" + (f" ({set_name})" if set_name else "")
+                if other:
+                    line += " " + hint.format(other)
+                lines.append(line)
+            if len(items) > limit:
+                lines.append(f"  ... y {len(items) - limit} más")
+        return "\n".join(lines)
+
+    def lookup_name_pairs(self, pairs):
+        """Devuelve {(nombre, set): card_id} para los pares que existan en `cartas`.
+
+        Con el catálogo en memoria cargado se resuelve en Python; si no, con
+        una sola consulta a SQLite.
+        """
+        if not pairs:
+            return {}
+        if self.catalog.ready:
+            found = {}
+            for name, set_name in pairs:
+                card = self.catalog.find_by_name(name, set_name)
+                if card is not None:
+                    found[(name, set_name)] = card.id
+            return found
+        self.cursor.execute("CREATE TEMP TABLE IF NOT EXISTS import_names (nombre TEXT, set_nombre TEXT)")
+        self.cursor.execute("DELETE FROM temp.import_names")
+        self.cursor.executemany("INSERT INTO temp.import_names VALUES (?, ?)", pairs)
+        # La primera carta (menor rowid) de cada par, como hacía el LIMIT 1
+        self.cursor.execute("""
+            SELECT i.nombre, i.set_nombre, c.id, MIN(c.rowid)
+            FROM temp.import_names i
+            JOIN cartas c
+              ON c.nombre = i.nombre
+             AND (i.set_nombre IS NULL OR c.set_nombre = i.set_nombre)
+            GROUP BY i.rowid
+        """)
+        found = {(name, set_name): str(card_id) for name, set_name, card_id, _ in self.cursor.fetchall()}
+        self.cursor.execute("DELETE FROM temp.import_names")
+        return found
+
+    def get_name_matcher(self):
+        """Índice de nombres aproximados, reconstruido si cards.db ha cambiado"""
+        signature = self.search_index.source_signature()
+        if getattr(self, '_name_matcher_signature', None) != signature:
+            self.cursor.execute("SELECT DISTINCT nombre FROM cartas")
+            self._name_matcher = CardNameMatcher(row[0] for row in self.cursor.fetchall())
+            self._name_matcher_signature = signature
+        return self._name_matcher
+
     def get_next_deck_number(self):
         """Encuentra el próximo número de deck disponible empezando desde 3"""
         # Crear directorio si no existe
@@ -1463,8 +3656,8 @@ class WagicCollectionManager:
         else:
             # Actualizar cantidad
             self.collection[card_id] = new_quantity
-            self.save_collection()
-            self.update_collection_display()
+            self.schedule_collection_save()
+            self.refresh_collection_rows([card_id])
             self.update_collection_total()  # Actualizar el contador total
             self.update_status(f"Carta {card_id}: cantidad actualizada a {new_quantity}")
             
@@ -1492,8 +3685,8 @@ class WagicCollectionManager:
             # Eliminar carta de la colección
             if card_id in self.collection:
                 del self.collection[card_id]
-                self.save_collection()
-                self.update_collection_display()
+                self.schedule_collection_save()
+                self.refresh_collection_rows([card_id])
                 self.update_collection_total()  # Actualizar el contador total
                 self.update_status(f"Todas las copias de {name} (ID: {card_id}) eliminadas")
                 
@@ -1504,6 +3697,7 @@ class WagicCollectionManager:
 
     def load_decks_list(self):
         """Carga la lista de decks disponibles"""
+        self.saver.flush()  # Que los archivos reflejen los últimos cambios antes de leerlos
         self.decks = []
         if os.path.exists(self.decks_path):
             for filename in os.listdir(self.decks_path):
@@ -1552,7 +3746,8 @@ class WagicCollectionManager:
         # Cargar nombre del deck
         self.deck_name_var.set(deck_name)
         
-        # Cargar cartas del deck
+        # Cargar cartas del deck (con el guardado diferido ya escrito)
+        self.saver.flush()
         self.deck_cards = {}
         try:
             with open(deck_path, 'r', encoding='utf-8') as f:
@@ -1572,42 +3767,20 @@ class WagicCollectionManager:
         self.update_status(f"Deck loaded: {deck_name} - {len(self.deck_cards)} unique cards")
     
     def update_deck_display(self):
-        """Actualiza la visualización del deck con nueva columna Type"""
-        self.deck_tree.delete(*self.deck_tree.get_children())
-        
-        if not self.deck_cards:
-            return
-        
+        """Actualiza la visualización del deck con nueva columna Type (por bloques)"""
+        rows = []
         try:
             # Obtener detalles de las cartas en el deck
-            card_ids = list(self.deck_cards.keys())
-            placeholders = ','.join('?' for _ in card_ids)
-            
-            self.cursor.execute(f"""
-                SELECT id, nombre, mana, set_nombre, tipo 
-                FROM cartas 
-                WHERE id IN ({placeholders})
-            """, card_ids)
+            card_details = self.get_cards(self.deck_cards.keys())
             
-            card_details = {row[0]: (row[1], row[2], row[3], row[4]) for row in self.cursor.fetchall()}
-            
-            # Insertar en el treeview
-            for card_id, count in self.deck_cards.items():
-                if card_id in card_details:
-                    name, mana, set_name, card_type = card_details[card_id]
-                    self.deck_tree.insert('', tk.END, values=(card_id, name, mana, set_name, count, card_type))
-                else:
-                    self.cursor.execute("SELECT nombre, mana, set_nombre, tipo FROM cartas WHERE id = ?", (card_id,))
-                    result = self.cursor.fetchone()
-                    if result:
-                        name, mana, set_name, card_type = result
-                        self.deck_tree.insert('', tk.END, values=(card_id, name, mana, set_name, count, card_type))
-                    else:
-                        self.deck_tree.insert('', tk.END, values=(card_id, "Card not found", "", "Unknown set", count, ""))
+            rows = [self.deck_row(card_id, count, card_details.get(card_id))
+                    for card_id, count in self.deck_cards.items()]
         
         except sqlite3.Error as e:
             logging.error(f"Error loading deck details: {str(e)}")
         
+        self.populate_tree(self.deck_tree, rows)
+        
         # Actualizar el contador total
         self.update_deck_total()
 
@@ -1632,7 +3805,9 @@ class WagicCollectionManager:
         self.deck_cards[card_id] = new_quantity
 
         # Actualizar la fila en el treeview
-        self.deck_tree.item(item, values=(card_id, values[1], values[2], values[3], new_quantity, values[5]))
+        self.apply_tree_changes(self.deck_tree, {card_id: values[:4] + (new_quantity, values[5])},
+                                self.update_deck_display)
+        self.schedule_deck_save()
 
         # Actualizar la información de la carta si está seleccionada
         if self.deck_tree.selection() == selected_items:
@@ -1660,11 +3835,13 @@ class WagicCollectionManager:
         if new_quantity <= 0:
             # Eliminar la carta del deck
             del self.deck_cards[card_id]
-            self.deck_tree.delete(item)
+            self.apply_tree_changes(self.deck_tree, {card_id: None}, self.update_deck_display)
         else:
             # Actualizar cantidad
             self.deck_cards[card_id] = new_quantity
-            self.deck_tree.item(item, values=(card_id, values[1], values[2], values[3], new_quantity, values[5]))
+            self.apply_tree_changes(self.deck_tree, {card_id: values[:4] + (new_quantity, values[5])},
+                                    self.update_deck_display)
+        self.schedule_deck_save()
 
         # Actualizar la información de la carta si está seleccionada
         if self.deck_tree.selection() == selected_items and new_quantity > 0:
@@ -1690,8 +3867,12 @@ class WagicCollectionManager:
         deck_path = os.path.join(self.decks_path, filename)
         
         # Crear archivo con nombre
-        with open(deck_path, 'w', encoding='utf-8') as f:
-            f.write(f"#NAME:{deck_name}\n")
+        try:
+            self.saver.write(deck_path, format_deck_file(deck_name, []))
+        except Exception as e:
+            logging.error(f"Error creating deck: {str(e)}")
+            messagebox.showerror("Error", f"Could not create deck: {str(e)}")
+            return
         
         # Actualizar lista de decks
         self.decks.append((filename, deck_name))
@@ -1713,6 +3894,7 @@ class WagicCollectionManager:
         if not hasattr(self, 'current_deck_path') or not self.current_deck_path:
             messagebox.showinfo("Error", LANG["msg_no_deck_selected"])
             return
+        self.saver.flush()  # Que un guardado diferido no reescriba el nombre antiguo
         
         new_name = simpledialog.askstring(LANG["button_rename_deck"], LANG["msg_rename_deck"], 
                                          initialvalue=self.deck_name_var.get())
@@ -1729,8 +3911,7 @@ class WagicCollectionManager:
                     else:
                         lines.append(line)
             
-            with open(self.current_deck_path, 'w', encoding='utf-8') as f:
-                f.writelines(lines)
+            self.saver.write(self.current_deck_path, "".join(lines))
         except Exception as e:
             logging.error(f"Error renaming deck: {str(e)}")
             messagebox.showerror("Error", f"Could not rename deck: {str(e)}")
@@ -1762,6 +3943,9 @@ class WagicCollectionManager:
             return
         
         try:
+            # Un guardado diferido no debe volver a crear el archivo borrado
+            self.saver.discard(self.current_deck_path)
+            self.saver.flush()
             os.remove(self.current_deck_path)
             
             # Actualizar lista de decks
@@ -1797,11 +3981,7 @@ class WagicCollectionManager:
             return
         
         try:
-            with open(self.current_deck_path, 'w', encoding='utf-8') as f:
-                f.write(f"#NAME:{deck_name}\n")
-                for card_id, count in self.deck_cards.items():
-                    for _ in range(count):
-                        f.write(f"{card_id}\n")
+            self.saver.write(self.current_deck_path, format_deck_file(deck_name, self.deck_cards.items()))
             
             self.update_status(f"Deck saved: {deck_name}")
             messagebox.showinfo("Success", LANG["msg_deck_saved"])
@@ -1830,15 +4010,14 @@ class WagicCollectionManager:
             with open(file_path, 'w', encoding='utf-8') as out_file:
                 out_file.write(f"#NAME:{deck_name}\n")
                 
+                card_details = self.get_cards(self.deck_cards.keys())
                 for card_id, count in self.deck_cards.items():
                     # Obtener detalles de la carta
-                    self.cursor.execute("SELECT nombre, set_nombre FROM cartas WHERE id = ?", (card_id,))
-                    result = self.cursor.fetchone()
+                    card = card_details.get(card_id)
                     
-                    if result:
-                        name, set_name = result
-                        set_name = set_name if set_name else "Unknown"
-                        out_file.write(f"{name} ({set_name}) *{count}\n")
+                    if card:
+                        set_name = card.set_nombre if card.set_nombre else "Unknown"
+                        out_file.write(f"{card.nombre} ({set_name}) *{count}\n")
                     else:
                         out_file.write(f"Unknown Card (ID: {card_id}) *{count}\n")
             
@@ -1866,72 +4045,25 @@ class WagicCollectionManager:
             with open(file_path, 'r', encoding='utf-8') as f:
                 deck_lines = f.readlines()
             
-            cards = []  # Lista de tuplas (card_id, quantity)
-            imported_deck_name = "Imported Deck"
+            imported_deck_name, entries = self.parse_deck_lines(deck_lines, "Imported Deck")
+            cards, missing, corrected = self.resolve_deck_entries(entries)
             total_copies = 0
             
-            # Expresión regular para analizar las líneas del deck
-            card_pattern = re.compile(r'(.+?)\s*(?:\(([^)]+)\))?\s*\*?(\d+)?$')
-            
-            for line in deck_lines:
-                line = line.strip()
-                if not line:
-                    continue
-                    
-                # Extraer nombre del deck
-                if line.startswith('#NAME:'):
-                    imported_deck_name = line.split(':', 1)[1].strip()
-                    continue
-                    
-                # Buscar cartas con el patrón
-                match = card_pattern.match(line)
-                if not match:
-                    # Intentar formato de ID directo (ej: "123456 4")
-                    if line.replace(' ', '').isdigit() or ' ' in line:
-                        parts = line.split()
-                        if len(parts) == 1 and parts[0].isdigit():
-                            card_id = parts[0]
-                            cards.append((card_id, 1))
-                            self.add_to_deck(card_id, 1)
-                            total_copies += 1
-                        elif len(parts) >= 2 and parts[0].isdigit() and parts[1].isdigit():
-                            card_id = parts[0]
-                            quantity = int(parts[1])
-                            cards.append((card_id, quantity))
-                            self.add_to_deck(card_id, quantity)
-                            total_copies += quantity
-                    continue
-                    
-                card_name = match.group(1).strip()
-                set_name = match.group[2].strip() if match.group[2] else None
-                quantity = int(match.group[3]) if match.group[3] else 1
-                
-                # Buscar la carta en la base de datos
-                query = "SELECT id FROM cartas WHERE nombre = ?"
-                params = [card_name]
-                
-                if set_name:
-                    query += " AND set_nombre = ?"
-                    params.append(set_name)
-                    
-                self.cursor.execute(query + " LIMIT 1", params)
-                result = self.cursor.fetchone()
-                
-                if result:
-                    card_id = result[0]
-                    cards.append((card_id, quantity))
-                    # Agregar al deck
-                    self.add_to_deck(card_id, quantity)
-                    total_copies += quantity
-                else:
-                    logging.warning(f"Card not found: {card_name} ({set_name})")
+            for card_id, quantity in cards:
+                # Agregar al deck
+                self.add_to_deck(card_id, quantity)
+                total_copies += quantity
+            for card_name, set_name, suggestion in missing:
+                hint = f" - did you mean '{suggestion}'?" if suggestion else ""
+                logging.warning(f"Card not found: {card_name} ({set_name}){hint}")
             
             if cards:
                 self.update_deck_display()
                 self.save_current_deck()
                 messagebox.showinfo("Success", 
                     f"Deck imported!\n"
-                    f"Cards added: {len(cards)} unique, {total_copies} total copies")
+                    f"Cards added: {len(cards)} unique, {total_copies} total copies"
+                    f"{self.format_missing_cards(missing, corrected)}")
                 self.update_status(f"Deck imported: {len(cards)} cards")
             else:
                 messagebox.showwarning("Empty Deck", "No valid cards found in the file")
@@ -2035,16 +4167,10 @@ class WagicCollectionManager:
             result_tree.delete(*result_tree.get_children())
             
             try:
-                # Búsqueda mejorada: nombre, tipo o texto
-                self.cursor.execute("""
-                    SELECT id, nombre, set_nombre, rarity, tipo 
-                    FROM cartas 
-                    WHERE nombre LIKE ? 
-                       OR tipo LIKE ?
-                       OR texto LIKE ?
-                    ORDER BY nombre
-                    LIMIT 1000  -- Limitar resultados para mejor rendimiento
-                """, (f'%{query}%', f'%{query}%', f'%{query}%'))
+                # Búsqueda en el índice de texto completo (limitada para mejor rendimiento)
+                sql, params = self.search_index.build_query(
+                    self.conn, query, ("id", "nombre", "set_nombre", "rarity", "tipo"), limit=1000)
+                self.cursor.execute(sql, params)
                 
                 results = self.cursor.fetchall()
                 
@@ -2067,10 +4193,12 @@ class WagicCollectionManager:
                 return
 
             added_count = 0
+            added_ids = []
             for item in selected_items:
                 values = result_tree.item(item, 'values')
                 if values:
                     card_id = values[0]
+                    added_ids.append(card_id)
                     
                     # Agregar al deck actual (1 copia por carta)
                     self.add_to_deck(card_id, 1)
@@ -2082,10 +4210,10 @@ class WagicCollectionManager:
                     added_count += 1
 
             # Actualizar datos
-            self.save_collection()
-            self.update_collection_display()
-            self.update_deck_display()
-            self.update_deck_total()
+            self.schedule_collection_save()
+            self.refresh_collection_rows(added_ids)
+            self.refresh_deck_rows(added_ids)
+            self.schedule_deck_save()
             
             dialog.destroy()
             messagebox.showinfo("Éxito", 
@@ -2104,27 +4232,60 @@ class WagicCollectionManager:
         
     # ===== FUNCIONES PARA ORDENAMIENTO Y TOTALES =====
     
-    def sort_treeview(self, tree, column, reverse):
-        """Ordena un Treeview por la columna seleccionada"""
-        items = [(tree.set(item, column), item) for item in tree.get_children('')]
-        
-        # Determinar el tipo de datos para ordenar adecuadamente
-        if column == "ID" or column == "Cantidad" or column == "Quantity":
-            # Ordenar como números
-            try:
-                items.sort(key=lambda t: int(t[0]) if t[0].isdigit() else 0, reverse=reverse)
-            except:
-                items.sort(key=lambda t: t[0], reverse=reverse)
+    def sort_treeview(self, tree, column, add=False):
+        """Ordena un Treeview por la columna seleccionada.
+
+        Un clic ordena por esa columna (o invierte el sentido si ya era la
+        principal); con Mayúsculas se añade como criterio secundario. Se ordena
+        el modelo en Python y el árbol se reordena con una sola llamada a Tk.
+        """
+        order = list(self._tree_sort.get(tree, []))
+        columns = [c for c, _ in order]
+        if add and column in columns:
+            index = columns.index(column)
+            order[index] = (column, not order[index][1])
+        elif add:
+            order.append((column, False))
+        elif columns[:1] == [column]:
+            order = [(column, not order[0][1])]
         else:
-            # Ordenar como texto
-            items.sort(key=lambda t: t[0].lower(), reverse=reverse)
-        
-        # Reordenar los ítems en el Treeview
-        for index, (val, item) in enumerate(items):
-            tree.move(item, '', index)
-        
-        # Alternar la dirección para el próximo clic
-        tree.heading(column, command=lambda: self.sort_treeview(tree, column, not reverse))
+            order = [(column, False)]
+        self._tree_sort[tree] = order
+        self.update_sort_headings(tree)
+        
+        populator = self._populators.get(tree)
+        model = self.tree_model(tree)
+        if populator is not None and populator.busy:
+            # Aún quedan filas por insertar: volver a rellenar ya ordenado
+            self.populate_tree(tree, list(model.rows.values()) + populator.pending_rows())
+            return
+        self.resort_tree(tree)
+
+    def update_sort_headings(self, tree):
+        """Muestra en las cabeceras el sentido (y la prioridad) del orden actual"""
+        order = self._tree_sort.get(tree, [])
+        for column in tree["columns"]:
+            text = column
+            for position, (sorted_column, reverse) in enumerate(order, 1):
+                if sorted_column == column:
+                    text = f"{column} {'▼' if reverse else '▲'}"
+                    if len(order) > 1:
+                        text += str(position)
+            tree.heading(column, text=text)
+
+    def enable_multi_sort(self, tree):
+        """Mayúsculas + clic en una cabecera añade esa columna al orden"""
+        def on_shift_click(event):
+            if tree.identify_region(event.x, event.y) != "heading":
+                return None
+            column_ref = tree.identify_column(event.x)  # '#1', '#2', ...
+            columns = tree["columns"]
+            index = int(column_ref[1:]) - 1
+            if 0 <= index < len(columns):
+                self.sort_treeview(tree, columns[index], add=True)
+            return "break"
+        
+        tree.bind("<Shift-Button-1>", on_shift_click)
     
     def update_collection_total(self):
         """Actualiza el contador total de cartas en la colección"""
@@ -2145,11 +4306,30 @@ class WagicCollectionManager:
         self.deck_total_var.set(f"Total cards: {total_cards} ({unique_cards} unique)")
 
     def on_closing(self):
+        self.saver.close()  # Escribir los cambios aún pendientes
+        self.search_worker.close()
+        self.thumb_loader.close()
+        self.thumb_atlas.close_all()
+        self.archive_pool.close_all()
         self.conn.close()
-        self.clean_temp_folder()
+        # La caché de miniaturas no se recorre al salir: put() lleva la cuenta
+        # de used_bytes y lanza trim_async en cuanto se pasa del presupuesto
         self.root.destroy()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=LANG["app_title"])
+    parser.add_argument("--prewarm", action="store_true",
+                        help="pre-genera las miniaturas de todos los sets y termina")
+    parser.add_argument("--detail", action="store_true",
+                        help="con --prewarm, genera también las imágenes de detalle")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="procesos para --prewarm (por defecto, uno por núcleo)")
+    args = parser.parse_args()
+    if args.prewarm:
+        sizes = (THUMBNAIL_SIZE, DETAIL_SIZE) if args.detail else (THUMBNAIL_SIZE,)
+        prewarm_thumbnails(SETS_BASE_PATH, CACHE_DIR, sizes, args.workers)
+        sys.exit(0)
+    
     root = tk.Tk()
     app = WagicCollectionManager(root)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)